@@ -9,3 +9,9 @@ worker_class = 'sync'
 max_requests = 300
 max_requests_jitter = 300
 errorlog = '-'
+
+
+def post_worker_init(worker):
+    """Build the autocomplete index before the worker's first request."""
+    from stroyprombeton import autocomplete
+    autocomplete.index.get()
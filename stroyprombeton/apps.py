@@ -5,3 +5,6 @@ from django.utils.translation import ugettext_lazy as _
 class StroyprombetonAppConfig(AppConfig):
     name = 'stroyprombeton'
     verbose_name = _('Stroyprombeton')
+
+    def ready(self):
+        from stroyprombeton import signals  # Ignore PyFlakesBear
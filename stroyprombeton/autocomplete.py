@@ -0,0 +1,130 @@
+"""
+In-memory autocomplete index.
+
+Every worker keeps the index of active categories and options in memory
+and answers autocomplete requests without DB queries.
+Indexed fields changes bump the index version at the shared cache,
+so workers rebuild their indexes on the next request.
+"""
+
+import re
+import threading
+import typing
+from bisect import bisect_left
+
+from django.urls import reverse
+
+from stroyprombeton import models as stb_models, versions
+
+# the greatest char to find the end of a prefix range
+MAX_CHAR = '\U0010ffff'
+
+
+def split_words(text: str) -> typing.List[str]:
+    return re.findall(r'\w+', text.lower())
+
+
+class Entry(typing.NamedTuple):
+    type: str
+    name: str
+    url_name: str
+    url_id: int
+    mark: str = ''
+    code: str = ''
+
+    @property
+    def url(self) -> str:
+        return reverse(self.url_name, args=(self.url_id,))
+
+    def words(self) -> typing.Set[str]:
+        return set(split_words(f'{self.name} {self.mark} {self.code}'))
+
+    def as_dict(self) -> dict:
+        return {
+            'type': self.type,
+            'name': self.name,
+            'mark': self.mark,
+            'url': self.url,
+        }
+
+
+class PrefixIndex:
+    """Find entries, every word of them starts with one of the term words."""
+
+    def __init__(self, entries: typing.List[Entry]):
+        self.entries = entries
+        # sorted words list works like a trie:
+        # words with the same prefix are neighbours in it.
+        pairs = sorted(
+            (word, i) for i, entry in enumerate(entries) for word in entry.words()
+        )
+        self.words = [word for word, _ in pairs]
+        self.entry_ids = [i for _, i in pairs]
+
+    def find_by_prefix(self, prefix: str) -> typing.Set[int]:
+        start = bisect_left(self.words, prefix)
+        end = bisect_left(self.words, prefix + MAX_CHAR, lo=start)
+        return set(self.entry_ids[start:end])
+
+    def search(self, term: str, limit: int) -> typing.List[Entry]:
+        term_words = split_words(term)
+        if not term_words:
+            return []
+        found = set.intersection(*map(self.find_by_prefix, term_words))
+
+        # entries are already ordered by type and name.
+        # Entries with the name started by term go first.
+        term = term.strip().lower()
+        entries = sorted(
+            (self.entries[i] for i in sorted(found)),
+            key=lambda entry: not entry.name.lower().startswith(term),
+        )
+        return entries[:limit]
+
+
+def load_entries() -> typing.List[Entry]:
+    categories = (
+        stb_models.Category.objects
+        .active()
+        .order_by('name')
+        .values_list('id', 'name')
+    )
+    options = (
+        stb_models.Option.objects
+        .active()
+        .order_by('product__name', 'mark')
+        .values_list('product_id', 'product__name', 'mark', 'code')
+    )
+    return [
+        *(Entry('category', name, 'category', id_) for id_, name in categories),
+        *(
+            Entry('product', name, 'product', product_id, mark, str(code or ''))
+            for product_id, name, mark, code in options.iterator()
+        ),
+    ]
+
+
+def invalidate():
+    """Make workers to rebuild their indexes."""
+    return versions.bump(versions.AUTOCOMPLETE)
+
+
+class CachedIndex:
+    """Worker's index, that is rebuilt on the cached version change."""
+
+    def __init__(self):
+        self._index = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self) -> PrefixIndex:
+        version = versions.get(versions.AUTOCOMPLETE)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._index = PrefixIndex(load_entries())
+                    self._version = version
+        return self._index
+
+
+index = CachedIndex()
@@ -39,6 +39,18 @@ beat_schedule = {
         'task': 'stroyprombeton.tasks.update_prices',
         'schedule': timedelta(hours=2),
     },
+    'rebuild-prices': {
+        'task': 'stroyprombeton.tasks.rebuild_prices',
+        'schedule': timedelta(days=1),
+    },
+    'flush-mail-spool': {
+        'task': 'stroyprombeton.tasks.flush_mail_spool',
+        'schedule': timedelta(minutes=10),
+    },
+    'generate-sitemaps': {
+        'task': 'stroyprombeton.tasks.generate_sitemaps',
+        'schedule': timedelta(days=1),
+    },
 }
 
 # http://docs.celeryproject.org/en/master/userguide/routing.html
@@ -48,11 +60,36 @@ task_routes = {
         'routing_key': 'utils.mail',
         'priority': 50,
     },
+    'stroyprombeton.tasks.send_mail': {
+        'queue': 'mail',
+        'routing_key': 'utils.mail',
+        'priority': 50,
+    },
+    'stroyprombeton.tasks.flush_mail_spool': {
+        'queue': 'mail',
+        'routing_key': 'utils.mail',
+        'priority': 40,
+    },
     'stroyprombeton.tasks.update_prices': {
         'queue': 'command',
         'routing_key': 'utils.command',
         'priority': 30,
     },
+    'stroyprombeton.tasks.rebuild_prices': {
+        'queue': 'command',
+        'routing_key': 'utils.command',
+        'priority': 30,
+    },
+    'stroyprombeton.tasks.render_pdf_price': {
+        'queue': 'command',
+        'routing_key': 'utils.command',
+        'priority': 40,
+    },
+    'stroyprombeton.tasks.generate_sitemaps': {
+        'queue': 'command',
+        'routing_key': 'utils.command',
+        'priority': 20,
+    },
 }
 
 # Using a string here means the worker don't have to serialize
@@ -10,12 +10,14 @@ from functools import partial
 
 from django import http
 from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import get_object_or_404
 
 from catalog import context, typing
 from images.models import Image
 from pages import context as pages_context
-from stroyprombeton import models as stb_models, context as stb_context, request_data
+from stroyprombeton import models as stb_models, context as stb_context, request_data, versions
+from stroyprombeton.context.helpers import memoize
 
 
 class TagsByOptions(context.Tags):
@@ -24,6 +26,7 @@ class TagsByOptions(context.Tags):
         self._tags = tags
         self.options = options
 
+    @memoize
     def qs(self):
         return (
             self._tags.qs()
@@ -62,6 +65,7 @@ class Catalog(context.Context):
 
     def __init__(self, request_data_: request_data.Category):
         self.request_data = request_data_
+        self.category_context = CategoryContext(self.request_data)
 
     @property
     def page(self):
@@ -69,23 +73,22 @@ class Catalog(context.Context):
 
     @property
     def category(self):
-        return get_object_or_404(
-            stb_models.Category.objects.active().prefetch_related('page'),
-            id=self.request_data.id
-        )
+        return self.category_context.object()
 
     def context(self) -> typing.ContextDict:
         tags = FilteredTags(stb_models.Tag.objects.all(), self.request_data)
-        options_ = stb_context.options.Filtered(self.category, tags.qs())
+        filtered = stb_context.options.Filtered(self.category, tags.qs())
 
-        if not options_.qs():
+        if not filtered.qs().exists():
             raise http.Http404('<h1>В категории нет изделий</h1')
 
         # @todo #514:60m  Create PaginatedOptions class.
         #  Without code doubling between the new class
         #  and `context.products.PaginatedProducts` one.
         sliced_options = context.products.PaginatedProducts(
-            products=options_.qs(),
+            products=stb_context.options.CachedPages(
+                filtered, self.category, key=(self.request_data.tags,),
+            ),
             url=self.request_data.request.path,
             page_number=self.request_data.pagination_page_number,
             per_page=self.request_data.pagination_per_page,
@@ -94,11 +97,8 @@ class Catalog(context.Context):
         images = context.products.ProductImages(
             sliced_options.products, Image.objects.all()
         )
-        grouped_tags = context.tags.GroupedTags(
-            tags=TagsByOptions(stb_context.tags.All(), options_.qs())
-        )
+        grouped_tags = stb_context.tags.Facets(filtered.qs(), self.category, tags.qs())
         page = Page(self.page, tags)
-        category = CategoryContext(self.request_data)
         params = {
             'limits': settings.CATEGORY_STEP_MULTIPLIERS,
         }
@@ -107,7 +107,7 @@ class Catalog(context.Context):
         return {
             **params,
             **pages_context.Contexts([
-                page, category, sliced_options,
+                page, self.category_context, sliced_options,
                 images, grouped_tags
             ]).context()
         }
@@ -118,6 +118,7 @@ class CategoryContext(context.Context):
     def __init__(self, request_data_: request_data.Category):
         self.request_data = request_data_
 
+    @memoize
     def object(self) -> stb_models.Category:
         return get_object_or_404(
             stb_models.Category.objects.active().prefetch_related('page'),
@@ -138,6 +139,7 @@ class FilteredTags(context.Tags):
         super().__init__(qs=tags)
         self.request_data = request_data_
 
+    @memoize
     def qs(self) -> stb_models.TagQuerySet:
         selected_tags = context.tags.ParsedTags(
             tags=context.Tags(self._qs),
@@ -154,23 +156,61 @@ class FetchOptions(context.Context):
     def __init__(self, request_data_: request_data.FetchProducts):
         self.request_data = request_data_
 
+    def total_count(self, options_: stb_context.options.Options) -> int:
+        """Cached count of the all options for the request's category, tags and term."""
+        key = 'fetch-options-count:{}:{}:{}:{}'.format(
+            self.request_data.id,
+            versions.get_category(self.request_data.id),
+            self.request_data.tags,
+            self.request_data.term if options_.is_searched else '',
+        )
+        return cache.get_or_set(
+            key, options_.qs().count, settings.OPTIONS_COUNT_CACHE_TIMEOUT,
+        )
+
     def context(self) -> typing.ContextDict:
         category = CategoryContext(self.request_data)
         tags = FilteredTags(stb_models.Tag.objects.all(), self.request_data)
-        options_ = stb_context.options.Sliced(
+        searched = stb_context.options.Searched(
             request_data_=self.request_data,
-            options=stb_context.options.Searched(
-                request_data_=self.request_data,
-                options=stb_context.options.Filtered(
-                    category.object(), tags.qs(),
-                )
+            options=stb_context.options.Filtered(
+                category.object(), tags.qs(),
             )
         )
+        # searched options have their own ordering, so they can't use keyset
+        sliced = (
+            stb_context.options.KeysetSliced(searched, self.request_data)
+            if self.request_data.cursor and not searched.is_searched
+            else stb_context.options.Sliced(searched, self.request_data)
+        )
+        options_ = stb_context.options.Cached(
+            sliced,
+            category.object(),
+            key=(
+                self.request_data.tags,
+                self.request_data.term if searched.is_searched else '',
+                # page
+                self.request_data.cursor,
+                self.request_data.offset,
+                self.request_data.length,
+            ),
+            keep_order=True,
+        )
         images = context.products.ProductImages(
             options_.qs(), Image.objects.all()
         )
 
+        fetched = list(options_.qs())
+        next_cursor = (
+            self.request_data.dump_cursor(
+                stb_context.options.ordering_key(fetched[-1])
+            )
+            if fetched and not searched.is_searched
+            else ''
+        )
+
         return {
-            'total_products': options_.qs().count(),
+            'total_products': self.total_count(searched),
+            'next_cursor': next_cursor,
             **pages_context.Contexts([options_, images]).context()
         }
@@ -0,0 +1,58 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+
+from stroyprombeton import versions
+
+
+def memoize(method):
+    """
+    Memoize a method without args per instance.
+
+    Context objects live during one request,
+    so it saves from re-fetching the same objects and re-building querysets.
+    """
+    attr_name = f'_memoized_{method.__name__}'
+
+    @wraps(method)
+    def wrapper(self):
+        if not hasattr(self, attr_name):
+            setattr(self, attr_name, method(self))
+        return getattr(self, attr_name)
+
+    return wrapper
+
+
+def category_key(prefix: str, category_id: int, key_parts: tuple) -> str:
+    return '{}:{}:{}:{}'.format(
+        prefix,
+        category_id,
+        versions.get_category(category_id),
+        hashlib.sha1(repr(key_parts).encode()).hexdigest(),
+    )
+
+
+def cached_ids(qs: models.QuerySet, category_id: int, *key_parts) -> list:
+    """
+    Ids of the evaluated queryset cached by the category version.
+
+    Signals bump versions only for the changed categories subtree,
+    so other categories stay cached during bulk edits.
+    """
+    return cache.get_or_set(
+        category_key('ids', category_id, key_parts),
+        lambda: list(qs.values_list('id', flat=True)),
+        settings.CATALOG_IDS_CACHE_TIMEOUT,
+    )
+
+
+def cached_count(qs: models.QuerySet, category_id: int, *key_parts) -> int:
+    """Count of the queryset cached by the category version like `cached_ids`."""
+    return cache.get_or_set(
+        category_key('count', category_id, key_parts),
+        qs.count,
+        settings.CATALOG_IDS_CACHE_TIMEOUT,
+    )
@@ -1,46 +1,19 @@
 import abc
 from functools import reduce
-from operator import or_
 
 from django.conf import settings
 from django.db import models
-from django.shortcuts import _get_queryset
 
 from catalog import typing
-from search.search import QuerySetType
 from stroyprombeton import models as stb_models, request_data
-
-
-# doubled `search.search.search` here to change name to product__name.
-# Redesign search module on refarm side in more extensible way.
-def search(term: str, model_type: typing.Union[models.Model, models.Manager, QuerySetType],
-           lookups: list, ordering) -> QuerySetType:
-    """Return search results based on a given model."""
-    def _get_Q(lookup):
-        return models.Q(**{lookup: term})
-
-    term = term.strip()
-    query_set = _get_queryset(model_type)
-    query = reduce(or_, map(_get_Q, lookups))
-
-    return (
-        query_set.filter(query)
-        .annotate(
-            is_name_start_by_term=models.Case(models.When(
-                product__name__istartswith=term,
-                then=models.Value(True)),
-                default=models.Value(False),
-                output_field=models.BooleanField()
-            )
-        )
-        .order_by(models.F('is_name_start_by_term').desc(), *ordering)
-    )
+from stroyprombeton.context.helpers import cached_count, cached_ids, memoize
 
 
 class Options(abc.ABC):
 
     @abc.abstractmethod
     def qs(self) -> stb_models.OptionQuerySet:
+        """Subclasses should memoize it. A context object lives during one request."""
         ...
 
     def context(self) -> typing.ContextDict:
@@ -52,8 +25,10 @@ class Options(abc.ABC):
 class All(Options):
 
     def __init__(self, qs: stb_models.OptionQuerySet = None):
-        self._qs = qs or stb_models.Option.objects.all()
+        # don't use `qs or ...`. It evaluates the whole queryset
+        self._qs = qs if qs is not None else stb_models.Option.objects.all()
 
+    @memoize
     def qs(self) -> stb_models.OptionQuerySet:
         return (
             self._qs
@@ -73,6 +48,7 @@ class CategoryFiltered(Options):
         self.options = options
         self.category = category
 
+    @memoize
     def qs(self) -> stb_models.OptionQuerySet:
         return (
             self.options
@@ -90,6 +66,7 @@ class TagsFiltered(Options):
         self.options = options
         self.tags = tags
 
+    @memoize
     def qs(self) -> stb_models.OptionQuerySet:
         return (
             self.options
@@ -113,18 +90,13 @@ class Filtered(Options):
             tags,
         )
 
+    @memoize
     def qs(self) -> stb_models.OptionQuerySet:
         return self.filtered.qs()
 
 
 class Searched(Options):
 
-    LOOKUPS = [
-        'product__name__icontains',
-        'code__icontains',
-        'mark__icontains',
-    ]
-
     def __init__(  # Ignore CPDBear
         self,
         options: Options,
@@ -133,14 +105,14 @@ class Searched(Options):
         self.options = options
         self.request_data = request_data_
 
+    @property
+    def is_searched(self) -> bool:
+        return bool(self.request_data.filtered and self.request_data.term)
+
+    @memoize
     def qs(self) -> stb_models.OptionQuerySet:
-        if self.request_data.filtered and self.request_data.term:
-            return search(
-                self.request_data.term,
-                self.options.qs(),
-                self.LOOKUPS,
-                ordering=('product__name', )
-            )
+        if self.is_searched:
+            return self.options.qs().search(self.request_data.term)
         else:
             return self.options.qs()
 
@@ -154,6 +126,143 @@ class Sliced(Options):
         self.options = options
         self.request_data = request_data_
 
+    @memoize
     def qs(self) -> stb_models.OptionQuerySet:
         offset, limit = self.request_data.offset, self.request_data.length
         return self.options.qs()[offset:offset + limit]
+
+
+def keyset_after(ordering: list, values: list) -> models.Q:
+    """
+    Filter options following the given ordering key values.
+
+    Ordering is ascending. Postgres puts nulls to the end for it.
+    """
+    field, *rest_fields = ordering
+    value, *rest_values = values
+    if value is None:
+        # nothing is greater than null
+        greater = models.Q(pk__in=[])
+        equal = models.Q(**{f'{field}__isnull': True})
+    else:
+        greater = (
+            models.Q(**{f'{field}__gt': value})
+            | models.Q(**{f'{field}__isnull': True})
+        )
+        equal = models.Q(**{field: value})
+
+    if not rest_fields:
+        return greater
+    return greater | (equal & keyset_after(rest_fields, rest_values))
+
+
+def ordering_key(option: stb_models.Option) -> list:
+    """Option values for the `settings.OPTIONS_ORDERING` fields."""
+    return [
+        reduce(getattr, field.split('__'), option)
+        for field in settings.OPTIONS_ORDERING
+    ]
+
+
+class KeysetSliced(Options):
+    """
+    Slice options following the request cursor.
+
+    Unlike `Sliced` it doesn't scan the skipped options,
+    so deep pages take the same time as the first one.
+    Works only with `settings.OPTIONS_ORDERING` ordered options.
+    """
+
+    def __init__(
+        self,
+        options: Options,
+        request_data_: request_data.FetchProducts
+    ):
+        self.options = options
+        self.request_data = request_data_
+
+    @memoize
+    def qs(self) -> stb_models.OptionQuerySet:
+        qs = self.options.qs()
+        cursor = self.request_data.cursor
+        if cursor:
+            qs = qs.filter(keyset_after(settings.OPTIONS_ORDERING, cursor))
+        return qs[:self.request_data.length]
+
+
+class Cached(Options):
+    """
+    Options fetched by their cached ids.
+
+    Ids are cached for the category and the given key parts.
+    So the cached options are fetched by primary keys
+    without the tags, closure and search joins.
+    """
+
+    def __init__(
+        self,
+        options: Options,
+        category: stb_models.Category,
+        key: tuple,
+        keep_order=False,
+    ):
+        """
+        :param keep_order: order options like the cached ids.
+        Use it for short lists ordered not by `settings.OPTIONS_ORDERING`.
+        """
+        self.options = options
+        self.category = category
+        self.key = key
+        self.keep_order = keep_order
+
+    @memoize
+    def ids(self) -> list:
+        return cached_ids(self.options.qs(), self.category.id, 'options', *self.key)
+
+    @memoize
+    def qs(self) -> stb_models.OptionQuerySet:
+        ids = self.ids()
+        qs = stb_models.Option.objects.filter(id__in=ids).bind_fields()
+        if not self.keep_order:
+            return qs.order_by(*settings.OPTIONS_ORDERING)
+        return qs.order_by(models.Case(
+            *[models.When(id=id_, then=position) for position, id_ in enumerate(ids)],
+            output_field=models.IntegerField(),
+        )) if ids else qs.none()
+
+
+class CachedPages:
+    """
+    Options sequence for a paginator with the cached count and page ids.
+
+    A paginator takes only the count and a slice for the current page.
+    So a big category doesn't fetch and cache ids of all its options.
+    """
+
+    def __init__(
+        self,
+        options: Options,
+        category: stb_models.Category,
+        key: tuple,
+    ):
+        self.options = options
+        self.category = category
+        self.key = key
+
+    def count(self) -> int:
+        return cached_count(self.options.qs(), self.category.id, 'options', *self.key)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, slice_: slice) -> stb_models.OptionQuerySet:
+        ids = cached_ids(
+            self.options.qs()[slice_], self.category.id,
+            'page', *self.key, slice_.start, slice_.stop,
+        )
+        return (
+            stb_models.Option.objects
+            .filter(id__in=ids)
+            .bind_fields()
+            .order_by(*settings.OPTIONS_ORDERING)
+        )
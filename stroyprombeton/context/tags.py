@@ -1,5 +1,5 @@
-from catalog import context
-from stroyprombeton import models as stb_models
+from catalog import context, typing
+from stroyprombeton import facets, models as stb_models
 
 # @todo #744:30m Move all tags related context classes in this file.
 
@@ -7,7 +7,26 @@ from stroyprombeton import models as stb_models
 class All(context.Tags):
 
     def __init__(self, qs: stb_models.TagQuerySet = None):
-        self._qs = qs or stb_models.Tag.objects.all()
+        self._qs = qs if qs is not None else stb_models.Tag.objects.all()
 
     def qs(self) -> stb_models.OptionQuerySet:
         return self._qs
+
+
+class Facets(context.Context):
+    """Tag groups with tags counts of the options. See `stroyprombeton.facets`."""
+
+    def __init__(
+        self,
+        options: stb_models.OptionQuerySet,
+        category: stb_models.Category,
+        tags: stb_models.TagQuerySet,
+    ):
+        self.options = options
+        self.category = category
+        self.tags = tags
+
+    def context(self) -> typing.ContextDict:
+        return {
+            'group_tags_pairs': facets.get(self.options, self.category, self.tags),
+        }
@@ -1,5 +1,7 @@
 from django.conf import settings
 
+from stroyprombeton import devices
+
 
 def site_info(request):
     return {
@@ -8,3 +10,7 @@ def site_info(request):
         'DEBUG': settings.DEBUG,
         'tags_ui_limit': settings.TAGS_UI_LIMIT,
     }
+
+
+def device(request):
+    return {'device': devices.get(request)}
@@ -0,0 +1,158 @@
+"""
+Crawler engine for third party sites.
+
+Fetcher loads pages concurrently over one pooled http session.
+Responses are cached at SQLite and revalidated by conditional requests,
+so repeated crawls load only changed pages.
+Parsed entities are kept at SQLite too to analyze them offline.
+"""
+
+import json
+import sqlite3
+import threading
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class FetchError(Exception):
+    pass
+
+
+class Storage:
+    """Thread safe SQLite table."""
+
+    SCHEMA = ''
+
+    def __init__(self, path: str):
+        # fetcher threads share the connection, so the lock serializes them
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute(self.SCHEMA)
+
+    def execute(self, sql: str, params=()) -> list:
+        with self.lock, self.connection:
+            return self.connection.execute(sql, params).fetchall()
+
+    def close(self):
+        self.connection.close()
+
+
+class Response(typing.NamedTuple):
+    url: str
+    content: bytes
+    etag: str
+    last_modified: str
+
+
+class ResponseCache(Storage):
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS responses (
+            url TEXT PRIMARY KEY,
+            content BLOB NOT NULL,
+            etag TEXT NOT NULL DEFAULT '',
+            last_modified TEXT NOT NULL DEFAULT ''
+        )
+    '''
+
+    def get(self, url: str) -> typing.Optional[Response]:
+        rows = self.execute(
+            'SELECT url, content, etag, last_modified FROM responses WHERE url = ?',
+            [url],
+        )
+        return Response(*rows[0]) if rows else None
+
+    def set(self, response: Response):
+        self.execute(
+            'INSERT OR REPLACE INTO responses (url, content, etag, last_modified)'
+            ' VALUES (?, ?, ?, ?)',
+            response,
+        )
+
+
+class EntityStore(Storage):
+    """Parsed entities of any kind. Every entity is a json object."""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS entities (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (kind, key)
+        )
+    '''
+
+    def save(self, kind: str, key: str, data: dict):
+        self.execute(
+            'INSERT OR REPLACE INTO entities (kind, key, data) VALUES (?, ?, ?)',
+            [kind, key, json.dumps(data, ensure_ascii=False)],
+        )
+
+    def all(self, kind: str) -> typing.Dict[str, dict]:
+        return {
+            key: json.loads(data)
+            for key, data in self.execute(
+                'SELECT key, data FROM entities WHERE kind = ? ORDER BY key', [kind],
+            )
+        }
+
+
+class Fetcher:
+    """Load site pages by their paths with a bounded concurrency."""
+
+    def __init__(self, base_url: str, cache: ResponseCache, workers=8, timeout=30):
+        self.base_url = base_url
+        self.cache = cache
+        self.workers = workers
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # every url is loaded at most once per crawl
+        self.loaded: typing.Dict[str, bytes] = {}
+
+    def url(self, path: str) -> str:
+        return urljoin(self.base_url, path)
+
+    def load(self, url: str) -> bytes:
+        cached = self.cache.get(url)
+        headers = {}
+        if cached and cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached and cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if cached and response.status_code == 304:
+            return cached.content
+        if response.status_code != 200:
+            raise FetchError(f'{url} responds with {response.status_code}')
+
+        self.cache.set(Response(
+            url=url,
+            content=response.content,
+            etag=response.headers.get('ETag', ''),
+            last_modified=response.headers.get('Last-Modified', ''),
+        ))
+        return response.content
+
+    def fetch(self, path: str) -> bytes:
+        url = self.url(path)
+        if url not in self.loaded:
+            self.loaded[url] = self.load(url)
+        return self.loaded[url]
+
+    def prefetch(self, paths: typing.Iterable[str]):
+        """Load the pages concurrently to fetch them later without waiting."""
+        urls = list({self.url(path) for path in paths} - self.loaded.keys())
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # `map` keeps the urls order and raises loading errors
+            self.loaded.update(zip(urls, executor.map(self.load, urls)))
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,57 @@
+"""
+Device types of the clients.
+
+ua-parser matches User-Agent headers by hundreds of regexes.
+Clients send a few distinct headers, so the classification is cached
+by the raw header in the worker memory.
+`DeviceMiddleware` classifies every request once.
+"""
+
+import enum
+from functools import lru_cache
+
+from django import http
+from user_agents import parse
+
+# distinct User-Agent headers to keep in the worker memory
+CACHE_SIZE = 1024
+
+
+class Device(enum.Enum):
+    MOBILE = 'mobile'
+    TABLET = 'tablet'
+    DESKTOP = 'desktop'
+    BOT = 'bot'
+
+    @property
+    def is_mobile(self) -> bool:
+        return self is Device.MOBILE
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def classify(user_agent: str) -> Device:
+    agent = parse(user_agent)
+    # mobile bots crawl mobile pages, so mobile check goes first
+    if agent.is_mobile:
+        return Device.MOBILE
+    if agent.is_tablet:
+        return Device.TABLET
+    if agent.is_bot:
+        return Device.BOT
+    return Device.DESKTOP
+
+
+def get(request: http.HttpRequest) -> Device:
+    """Get device type classified by the middleware or classify it."""
+    device = getattr(request, 'device', None)
+    return device or classify(request.META.get('HTTP_USER_AGENT', ''))
+
+
+class DeviceMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.device = get(request)
+        return self.get_response(request)
@@ -0,0 +1,57 @@
+"""
+Tag facets of the category options.
+
+Facets are tag groups with their tags. Every tag has the count of the options
+matching it among the category options filtered by the selected tags.
+They are counted by one aggregate query and cached by the category version.
+"""
+
+import typing
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+
+from stroyprombeton import models as stb_models, versions
+
+# version invalidates facets, so the timeout only cleans the cache
+CACHE_TIMEOUT = settings.CATALOG_IDS_CACHE_TIMEOUT
+
+Facets = typing.List[typing.Tuple[stb_models.TagGroup, typing.List[stb_models.Tag]]]
+
+
+def count(options: stb_models.OptionQuerySet) -> Facets:
+    """Group the options tags with `options_count` attribute by one query."""
+    # the filter before the annotation makes it count only the given options
+    tags = (
+        stb_models.Tag.objects
+        .filter(options__in=options.order_by().values('id'), group__isnull=False)
+        .select_related('group')
+        .annotate(options_count=models.Count('options'))
+        .order_by_alphanumeric()
+    )
+    groups = {}
+    for tag in tags:
+        groups.setdefault(tag.group, []).append(tag)
+    # sorting is stable, so tags keep their order in the groups
+    return sorted(groups.items(), key=lambda pair: (pair[0].position, pair[0].name))
+
+
+def get(
+    options: stb_models.OptionQuerySet,
+    category: stb_models.Category,
+    tags: stb_models.TagQuerySet,
+) -> Facets:
+    """
+    Get cached facets of the category options.
+
+    :param tags: selected tags to identify the options.
+    """
+    # differently ordered or unknown slugs resolve to the same tags
+    tags_key = ','.join(map(str, sorted(tags.values_list('id', flat=True))))
+    key = f'facets:{category.id}:{versions.get_category(category.id)}:{tags_key}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = count(options)
+        cache.set(key, facets, CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,29 @@
+import os
+import tempfile
+import typing
+
+
+def write_atomic(file_path: str, chunks: typing.Iterable[typing.AnyStr], mode='w'):
+    """
+    Write chunks to file.
+
+    Chunks are written to a temporary file, that replaces the target file at the end.
+    So a web server never serves a half-written file.
+    """
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        mode,
+        encoding=None if 'b' in mode else 'utf-8',
+        dir=directory,
+        suffix='.tmp',
+        delete=False,
+    ) as file:
+        try:
+            for chunk in chunks:
+                file.write(chunk)
+        except Exception:
+            os.remove(file.name)
+            raise
+    os.chmod(file.name, 0o644)
+    os.replace(file.name, file_path)
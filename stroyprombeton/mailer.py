@@ -1,7 +1,109 @@
+"""
+Emails dispatch.
+
+Forms views render messages and queue them to Celery, a task per message,
+so SMTP latency stays out of the request.
+If the broker is down, messages are spooled to disk.
+Web and Celery containers share the spool directory.
+`flush_spool` periodic task sends the spooled messages by batches.
+Without Celery messages are sent at once.
+"""
+
+import json
+import logging
+import os
+import typing
+import uuid
+
 from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 
-from ecommerce.mailer import send as send_mail
+from stroyprombeton.helpers import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# messages are sent with one SMTP connection per batch
+BATCH_SIZE = 50
+
+Message = typing.Dict[str, typing.Any]
+
+
+def build(*, subject: str, html: str) -> Message:
+    """Build json serializable message to pass it to Celery or to the spool."""
+    return {
+        'subject': subject,
+        'body': html,
+        'html': html,
+        'from_email': settings.EMAIL_SENDER,
+        'to': list(settings.EMAIL_RECIPIENTS),
+    }
+
+
+def to_email(message: Message, connection=None) -> EmailMultiAlternatives:
+    email = EmailMultiAlternatives(
+        subject=message['subject'],
+        body=message['body'],
+        from_email=message['from_email'],
+        to=message['to'],
+        connection=connection,
+    )
+    email.attach_alternative(message['html'], 'text/html')
+    return email
+
+
+def send(messages: typing.List[Message]):
+    """Send messages with one connection."""
+    get_connection().send_messages([to_email(message) for message in messages])
+
+
+def spool(messages: typing.List[Message]):
+    for message in messages:
+        write_atomic(
+            os.path.join(settings.MAIL_SPOOL_DIR, f'{uuid.uuid4().hex}.json'),
+            [json.dumps(message, ensure_ascii=False)],
+        )
+
+
+def flush_spool() -> int:
+    """Send spooled messages by batches. Return the sent messages count."""
+    if not os.path.isdir(settings.MAIL_SPOOL_DIR):
+        return 0
+    paths = sorted(
+        entry.path for entry in os.scandir(settings.MAIL_SPOOL_DIR)
+        if entry.name.endswith('.json')
+    )
+    sent = 0
+    for start in range(0, len(paths), BATCH_SIZE):
+        with get_connection() as connection:
+            for path in paths[start:start + BATCH_SIZE]:
+                with open(path, encoding='utf-8') as file:
+                    message = json.load(file)
+                try:
+                    to_email(message, connection).send()
+                except Exception:
+                    # failed message stays at the spool till the next flush
+                    logger.exception(f'Spooled message {path} is not sent.')
+                    continue
+                os.remove(path)
+                sent += 1
+    return sent
+
+
+def queue(messages: typing.List[Message]):
+    if not settings.USE_CELERY:
+        send(messages)
+        return
+
+    # tasks module imports this one
+    from stroyprombeton import tasks
+    for message in messages:
+        try:
+            tasks.send_mail.delay(message)
+        except Exception:
+            # broker errors differ with transports, so catch them all
+            logger.exception('Broker is unavailable. Message is spooled.')
+            spool([message])
 
 
 def send_form(*, form, template, subject):
@@ -14,11 +116,12 @@ def send_form(*, form, template, subject):
             'site_info': settings.SITE_INFO
         },
     )
+    queue([build(subject='Stroyprombeton | {}'.format(subject), html=message)])
 
-    send_mail(
-        subject='Stroyprombeton | {}'.format(subject),
-        message=message,
-        from_email=settings.EMAIL_SENDER,
-        recipient_list=settings.EMAIL_RECIPIENTS,
-        html_message=message
+
+def send_backcall(*, subject, name, phone, url):
+    message = render_to_string(
+        'ecommerce/email_backcall.html',
+        {'name': name, 'phone': phone, 'url': url},
     )
+    queue([build(subject=subject, html=message)])
@@ -0,0 +1,53 @@
+"""Compare autocomplete latency of the in-memory index and the trigram search."""
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from stroyprombeton import autocomplete
+from stroyprombeton.views import Autocomplete, TrigramAutocomplete
+
+
+def percentile(values: list, percent: int) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def get_terms(self, count: int, seed: int) -> list:
+        """Prefixes of the real names. Users type them."""
+        entries = autocomplete.index.get().entries
+        random_ = random.Random(seed)
+        names = [random_.choice(entries).name for _ in range(count)]
+        return [name[:random_.randint(2, max(2, len(name)))] for name in names]
+
+    def measure(self, view, terms: list) -> list:
+        factory = RequestFactory()
+        durations = []
+        for term in terms:
+            request = factory.get('/search/autocomplete/', {'term': term})
+            start = time.perf_counter()
+            view(request)
+            durations.append((time.perf_counter() - start) * 1000)
+        return durations
+
+    def handle(self, *args, **options):
+        terms = self.get_terms(options['requests'], options['seed'])
+        views = {
+            'index': Autocomplete.as_view(),
+            'trigram': TrigramAutocomplete.as_view(),
+        }
+        for name, view in views.items():
+            durations = self.measure(view, terms)
+            self.stdout.write(
+                f'{name}: p50 {statistics.median(durations):.2f} ms,'
+                f' p99 {percentile(durations, 99):.2f} ms'
+            )
@@ -0,0 +1,30 @@
+"""Measure png to jpeg conversion speed of the category_images command."""
+
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from stroyprombeton.management.commands.category_images import convert_images
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('folder', help='Folder with sample png images.')
+        parser.add_argument('--workers', type=int, default=None)
+
+    def handle(self, *args, **options):
+        # conversion removes the source images, so it works with their copy
+        with tempfile.TemporaryDirectory() as directory:
+            root = os.path.join(directory, 'images')
+            shutil.copytree(options['folder'], root)
+            start = time.perf_counter()
+            count = convert_images(root, options['workers'])
+            duration = time.perf_counter() - start
+
+        self.stdout.write(
+            f'{count} images in {duration:.2f} s, {count / duration:.1f} images/sec'
+        )
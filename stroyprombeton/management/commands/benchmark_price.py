@@ -0,0 +1,34 @@
+"""Measure the price command's generation speed and memory."""
+
+import os
+import resource
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from stroyprombeton.management.commands.price import Command as Price
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('--utm', default='YM')
+
+    def handle(self, *args, **options):
+        rows = Price.get_options().count()
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            Price.update_offers(options['utm'])
+            Price.write_yml(
+                os.path.join(directory, 'price.yml'),
+                Price.generate_yml(options['utm']),
+            )
+            duration = time.perf_counter() - start
+
+        # ru_maxrss is in kilobytes on Linux
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(
+            f'{rows} rows in {duration:.2f} s, {rows / duration:.0f} rows/sec,'
+            f' peak RSS {peak_rss:.1f} MB'
+        )
@@ -0,0 +1,60 @@
+"""Compare per request cost of the user agent parsing and the cached classification."""
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from user_agents import parse
+
+from stroyprombeton import devices
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    ' (KHTML, like Gecko) Chrome/75.0.3770.142 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 6.1; Win64; x64; rv:68.0) Gecko/20100101 Firefox/68.0',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 12_3_1 like Mac OS X) AppleWebKit/605.1.15'
+    ' (KHTML, like Gecko) Version/12.1.1 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Linux; Android 9; SM-G960F) AppleWebKit/537.36'
+    ' (KHTML, like Gecko) Chrome/75.0.3770.143 Mobile Safari/537.36',
+    'Mozilla/5.0 (iPad; CPU OS 12_3_1 like Mac OS X) AppleWebKit/605.1.15'
+    ' (KHTML, like Gecko) Version/12.1.1 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (compatible; YandexBot/3.0; +http://yandex.com/bots)',
+    'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+]
+
+
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def measure(self, classify, requests: list) -> list:
+        durations = []
+        for request in requests:
+            start = time.perf_counter()
+            classify(request)
+            durations.append((time.perf_counter() - start) * 10 ** 6)
+        return durations
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        random_ = random.Random(options['seed'])
+        requests = [
+            factory.get('/', HTTP_USER_AGENT=random_.choice(USER_AGENTS))
+            for _ in range(options['requests'])
+        ]
+        devices.classify.cache_clear()
+        ways = {
+            'parse': lambda request: parse(request.META['HTTP_USER_AGENT']).is_mobile,
+            'classify': lambda request: devices.get(request).is_mobile,
+        }
+        for name, classify in ways.items():
+            durations = self.measure(classify, requests)
+            self.stdout.write(
+                f'{name}: mean {statistics.mean(durations):.1f} us,'
+                f' median {statistics.median(durations):.1f} us per request'
+            )
+        self.stdout.write(str(devices.classify.cache_info()))
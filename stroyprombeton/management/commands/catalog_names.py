@@ -0,0 +1,14 @@
+"""Recompute stored catalog names for all options and products."""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from stroyprombeton.models import Option, Product
+
+
+class Command(BaseCommand):
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model in [Option, Product]:
+            model.update_catalog_names()
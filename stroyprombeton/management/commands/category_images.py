@@ -1,6 +1,9 @@
 import os
 import glob
-from PIL import Image as pillow_image
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
+from PIL import Image as pillow_image, ImageChops
 
 from django.core.management.base import BaseCommand
 from django.core.files.images import ImageFile
@@ -14,61 +17,79 @@ from stroyprombeton.models import Category
 IMAGES_ROOT_FOLDER_NAME = os.path.join(settings.MEDIA_ROOT, 'category_images')
 
 
-def create_image_models():
+def iter_dirs(path: str):
+    return (dir_ for dir_ in os.scandir(path) if dir_.is_dir())
 
-    def iter_dirs(path: str):
-        return (dir_ for dir_ in os.scandir(path) if dir_.is_dir())
 
-    def iter_files(path: str):
-        return (file_ for file_ in os.scandir(path) if file_.is_file())
+def iter_files(path: str):
+    return (file_ for file_ in os.scandir(path) if file_.is_file())
 
-    def get_page(category_id: int) -> Page:
-        product_ = Category.objects.filter(id=category_id).first()
-        return product_.page if product_ else None
 
-    def create_image_model(file_, category_id: int, slug):
-        file_short_name, _ = os.path.splitext(file_.name)
+def convert_png_to_jpeg(path: str):
+    file_short_name, _ = os.path.splitext(path)
 
-        # create Image model object based on current image
-        page = get_page(category_id=category_id)  # Ignore CPDBear
+    image = pillow_image.open(path).convert('RGBA')
 
-        if not page:
-            return
-        # don't use bulk create, because save() isn't hooked with it
-        # http://bit.ly/django_bulk_create
-
-        Image.objects.create(
-            model=page,
-            # autoincrement file names: '1.jpg', '2.jpg' and so on
-            slug=slug,
-            image=ImageFile(open(file_.path, mode='rb')),
-            is_main=(file_short_name == 'main')
+    # Convert black background color to white.
+    # Transparent black pixels are the only ones with all the bands equal to zero.
+    # Band operations work in C, so there is no loop over pixels in Python.
+    bands_max = reduce(ImageChops.lighter, image.split())
+    background = bands_max.point(lambda value: 255 if value == 0 else 0)
+    image.paste((255, 255, 255, 255), mask=background)
+
+    image.convert('RGB').save('{}.jpg'.format(file_short_name), 'JPEG')
+    os.remove(path)
+
+
+def convert_images(root: str, workers: int = None) -> int:
+    """Convert png images to jpeg by the process pool. Return the converted images count."""
+    paths = glob.glob(os.path.join(root, '**/*.png'), recursive=True)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # `list` raises exceptions from the workers
+        list(executor.map(convert_png_to_jpeg, paths))
+    return len(paths)
+
+
+def get_pages(dirs: list) -> dict:
+    """Map category ids to their pages by one query."""
+    return {
+        category.id: category.page
+        for category in (
+            Category.objects
+            .filter(id__in=[int(dir_.name) for dir_ in dirs])
+            .select_related('page')
         )
+    }
 
-    def convert_png_to_jpeg(path):
-        file_short_name, _ = os.path.splitext(path)
 
-        image = pillow_image.open(path).convert('RGBA')
-        image_data = image.load()
+def create_image_model(file_, page: Page, slug):
+    file_short_name, _ = os.path.splitext(file_.name)
 
-        # Convert black background color to white.
-        for x in range(image.size[0]):
-            for y in range(image.size[1]):
-                if image_data[x, y] == (0, 0, 0, 0):
-                    image_data[x, y] = (255, 255, 255, 255)
+    # don't use bulk create, because save() isn't hooked with it
+    # http://bit.ly/django_bulk_create
+    Image.objects.create(
+        model=page,
+        # autoincrement file names: '1.jpg', '2.jpg' and so on
+        slug=slug,
+        image=ImageFile(open(file_.path, mode='rb')),
+        is_main=(file_short_name == 'main')
+    )
 
-        image.save('{}.jpg'.format(file_short_name), 'JPEG')
-        os.remove(path)
 
-    for path in glob.glob(os.path.join(IMAGES_ROOT_FOLDER_NAME, '**/*.png'), recursive=True):
-        convert_png_to_jpeg(path)
+def create_image_models(workers: int = None):
+    convert_images(IMAGES_ROOT_FOLDER_NAME, workers)
 
+    dirs = list(iter_dirs(IMAGES_ROOT_FOLDER_NAME))
+    pages = get_pages(dirs)
     # run over every image in every folder
-    for dir_ in iter_dirs(IMAGES_ROOT_FOLDER_NAME):
+    for dir_ in dirs:
+        page = pages.get(int(dir_.name))
+        if not page:
+            continue
         for slug_index, file in enumerate(iter_files(dir_.path)):
             create_image_model(
                 file_=file,
-                category_id=int(dir_.name),
+                page=page,
                 slug=str(slug_index)
             )
     # old folder stays in fs as backup of old photos
@@ -76,5 +97,11 @@ def create_image_models():
 
 class Command(BaseCommand):
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Image converting processes count. CPUs count by default.',
+        )
+
     def handle(self, *args, **options):
-        create_image_models()
+        create_image_models(options['workers'])
@@ -0,0 +1,14 @@
+"""Recompute stored min prices for all categories, series and sections."""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from stroyprombeton.models import Category, Section, Series
+
+
+class Command(BaseCommand):
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model in [Category, Series, Section]:
+            model.update_min_prices()
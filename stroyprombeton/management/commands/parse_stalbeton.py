@@ -1,13 +1,14 @@
 """Takes catalog data from stalbeton.pro site."""
 
 import typing
-from functools import lru_cache
 from itertools import chain
-from urllib.parse import urljoin
 
 import bs4
-import requests
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.utils.functional import cached_property
+
+from stroyprombeton.crawler import EntityStore, Fetcher, ResponseCache
 
 
 class ThroughElements:
@@ -19,7 +20,7 @@ class ThroughElements:
     def roots(self) -> typing.List['RootCategoryPage']:
         roots = self.page.soup.select('.catalog-tabs-content__list .catalog-list__link')
         assert roots
-        return [RootCategoryPage(path=r['href']) for r in roots]
+        return [RootCategoryPage(path=r['href'], fetcher=self.page.fetcher) for r in roots]
 
     def work_doc(self) -> typing.List['CategoryPage']:
         # @todo #741:30m  Parse work docs from stalbeton.
@@ -30,26 +31,23 @@ class ThroughElements:
 class Page:
     SITE_URL = 'https://stalbeton.pro'
 
-    def __init__(self, path: str):
+    def __init__(self, path: str, fetcher: Fetcher):
         # '/catalog/dorozhnoe-stroitelstvo' for example
         self.path = path
+        self.fetcher = fetcher
 
     @property
     def url(self) -> str:
-        return urljoin(self.SITE_URL.strip('/'), self.path.strip('/'))
+        return self.fetcher.url(self.path)
 
     @property
-    @lru_cache(maxsize=1)
-    def page(self) -> requests.Response:
-        response = requests.get(self.url)
-        assert response.status_code == 200, self
-        return response
+    def content(self) -> bytes:
+        return self.fetcher.fetch(self.path)
 
-    @property
-    @lru_cache(maxsize=1)
+    @cached_property
     def soup(self) -> bs4.BeautifulSoup:
         return bs4.BeautifulSoup(
-            self.page.content.decode('utf-8'),
+            self.content.decode('utf-8'),
             'html.parser'
         )
 
@@ -79,6 +77,15 @@ class CategoryPage(Page):
         """
         return self.soup.select_one('#js-category-description').text
 
+    def data(self) -> dict:
+        return {
+            'url': self.url,
+            'title': self.title,
+            'h1': self.h1,
+            'description': self.description,
+            'text': self.text,
+        }
+
 
 class RootCategoryPage(CategoryPage):
     # @todo #741:30m  Implement parse_stalbeton.Category.children() method.
@@ -86,7 +93,7 @@ class RootCategoryPage(CategoryPage):
     #  The task has pros and cons, so, we'll discuss it for the first.
     def second_level(self) -> typing.List['SecondLevelCategoryPage']:
         return [
-            SecondLevelCategoryPage(p['href'])
+            SecondLevelCategoryPage(p['href'], self.fetcher)
             for p in self.soup.select('h2 > a.catalog-list__link')
         ]
 
@@ -94,7 +101,7 @@ class RootCategoryPage(CategoryPage):
 class SecondLevelCategoryPage(CategoryPage):
     def third_level(self) -> typing.List['ThirdLevelCategoryPage']:
         return [
-            ThirdLevelCategoryPage(p['href'])
+            ThirdLevelCategoryPage(p['href'], self.fetcher)
             for p in self.soup.select('h2 > a.catalog-list__link')
         ]
 
@@ -165,6 +172,14 @@ class Option(PageElement):
     def options(self) -> OptionPropertiesSet:
         return OptionPropertiesSet(self.soup.find(class_='product-info-param'))
 
+    def data(self) -> dict:
+        return {
+            'name': self.name,
+            'product_name': self.product_name,
+            'series': self.series,
+            'price': self.price,
+        }
+
 
 class ThirdLevelCategoryPage(CategoryPage):
     def options(self) -> typing.List[Option]:
@@ -184,22 +199,50 @@ class ThirdLevelCategoryPage(CategoryPage):
         ]
 
 
-def parse():
-    main = Page(path='/')
+def save_categories(store: EntityStore, categories: typing.List[CategoryPage]):
+    for category in categories:
+        store.save('category', category.path, category.data())
+
+
+def parse(fetcher: Fetcher, store: EntityStore):
+    """Crawl the catalog level by level. Pages of every level are loaded concurrently."""
+    main = Page(path='/', fetcher=fetcher)
     through = ThroughElements(page=main)
     roots = through.roots()
+    fetcher.prefetch(r.path for r in roots)
+    save_categories(store, roots)
     # @todo #741:30m  Create parse_stalbeton.Categories class.
     #  And hide children list assembling there.
     #  See PR #758 discussion for example.
-    seconds = chain.from_iterable((r.second_level() for r in roots))
-    thirds = chain.from_iterable((s.third_level() for s in seconds))
-    options = chain.from_iterable((t.options() for t in thirds))  # Ignore PyFlakesBear
-    # @todo #741:60m Save parsed stalbeton to a DB.
-    #  DB isn't required to be high performance.
-    #  It can be sqlite or postgres or pickle lib or whatever else.
-    #  DB is required to analyze data without loading stalbeton site every time.
+    seconds = list(chain.from_iterable((r.second_level() for r in roots)))
+    fetcher.prefetch(s.path for s in seconds)
+    save_categories(store, seconds)
+    thirds = list(chain.from_iterable((s.third_level() for s in seconds)))
+    fetcher.prefetch(t.path for t in thirds)
+    save_categories(store, thirds)
+    for option in chain.from_iterable((t.options() for t in thirds)):
+        store.save('option', option.path, option.data())
 
 
 class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--db', default=settings.STALBETON_DB,
+            help='SQLite file for the responses cache and the parsed entities.',
+        )
+        parser.add_argument('--site-url', default=Page.SITE_URL)
+        parser.add_argument(
+            '--workers', type=int, default=8, help='Concurrent requests count.',
+        )
+
     def handle(self, *args, **options):
-        parse()
+        cache = ResponseCache(options['db'])
+        store = EntityStore(options['db'])
+        fetcher = Fetcher(options['site_url'], cache, workers=options['workers'])
+        try:
+            parse(fetcher, store)
+        finally:
+            fetcher.close()
+            cache.close()
+            store.close()
@@ -1,17 +1,43 @@
 """
 yml_price command.
 
-Generate two price files: priceru.xml and yandex.yml.
+Generate price file yandex.yml.
+
+Every offer is rendered once and stored at `PriceFeedOffer`.
+With `--incremental` option only offers of changed options are rendered again.
+Then the file is assembled from the stored offers by chunks,
+so memory doesn't depend on the options count.
 """
 import os
 import typing
+from itertools import islice
 from urllib.parse import urljoin, urlencode
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.template.loader import render_to_string
+from django.db import transaction
+from django.template.loader import get_template, render_to_string
+
+from stroyprombeton.helpers import write_atomic
+from stroyprombeton.models import Category, Option, PriceFeedChange, PriceFeedOffer
+
+
+def get_root_slugs() -> typing.Dict[int, str]:
+    """Map category tree ids to slugs of their roots."""
+    return dict(
+        Category.objects
+        .filter(level=0)
+        .values_list('tree_id', 'page__slug')
+    )
+
 
-from stroyprombeton.models import Category, Option
+def chunked(iterable: typing.Iterable, size: int) -> typing.Iterator[list]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
 
 
 class Command(BaseCommand):
@@ -24,56 +50,132 @@ class Command(BaseCommand):
     }
     # price files will be stored in this dir
     BASE_DIR = settings.ASSETS_DIR
+    # offers are rendered and written to a file by chunks of this size
+    CHUNK_SIZE = 500
+    OFFERS_PLACEHOLDER = '__offers__'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Render only changed offers. Skip the files without changes.',
+        )
+        parser.add_argument(
+            '--static',
+            action='store_true',
+            help='Copy the files to the static root.',
+        )
 
     def handle(self, *args, **options):
+        changes = PriceFeedChange.objects.changed()
+        option_ids = set(changes.values())
         for utm, file_name in self.TARGETS.items():
             result_file = os.path.join(self.BASE_DIR, file_name)
-            self.write_yml(result_file, self.get_context_for_yml(utm))
+            is_full = (
+                not options['incremental']
+                or None in option_ids
+                or not os.path.exists(result_file)
+            )
+            if is_full:
+                self.update_offers(utm)
+            elif option_ids:
+                self.update_offers(utm, option_ids)
+            else:
+                self.stdout.write(f'{file_name} has no changes.')
+                continue
+
+            self.write_yml(result_file, self.generate_yml(utm))
+            if options['static']:
+                self.copy_to_static(result_file)
+
+        # failed run keeps the changes to render them next time
+        PriceFeedChange.objects.forget(changes)
 
     @staticmethod
-    def get_context_for_yml(utm):
-        """Create context dictionary for rendering files."""
-        def utm_urls(options) -> typing.Dict[Option, str]:
-            """Create mapping from option to UTM url."""
-            def url(option):
-                utm_params = [
-                    ('utm_source', utm),
-                    ('utm_medium', 'cpc'),
-                    ('utm_content', option.product.get_root_category().page.slug),
-                    ('utm_term', option.product.id),
-                ]
-                url = urljoin(settings.BASE_URL, option.product.url)
-                query_string = urlencode(utm_params)
-                return f'{url}?{query_string}'
-
-            return {
-                option: url(option) for option in options
-            }
-
-        categories = Category.objects.all()
-        options = (
-            Option
-            .objects
+    def get_options():
+        return (
+            Option.objects
             .select_related(
                 'product',
                 'product__page',
                 'product__category',
-                'product__category__page',
             )
-            .filter(product__category__in=categories, price__gt=0)
+            .filter(price__gt=0, product__isnull=False, product__category__isnull=False)
+            .order_by('id')
         )
 
-        return {
+    @staticmethod
+    def get_url(option: Option, utm: str, root_slugs: typing.Dict[int, str]) -> str:
+        utm_params = [
+            ('utm_source', utm),
+            ('utm_medium', 'cpc'),
+            ('utm_content', root_slugs[option.product.category.tree_id]),
+            ('utm_term', option.product.id),
+        ]
+        url = urljoin(settings.BASE_URL, option.product.url)
+        query_string = urlencode(utm_params)
+        return f'{url}?{query_string}'
+
+    @classmethod
+    @transaction.atomic
+    def update_offers(cls, utm: str, option_ids: typing.Iterable[int] = None):
+        """Render offers of the given options. Render all offers without `option_ids`."""
+        offers = PriceFeedOffer.objects.filter(target=utm)
+        options = cls.get_options()
+        if option_ids is not None:
+            offers = offers.filter(option_id__in=option_ids)
+            options = options.filter(id__in=option_ids)
+        offers.delete()
+
+        root_slugs = get_root_slugs()
+        offer_template = get_template('ecommerce/prices/offer.yml')
+        # iterator doesn't cache options, so memory is constant
+        for chunk in chunked(options.iterator(), cls.CHUNK_SIZE):
+            PriceFeedOffer.objects.bulk_create(
+                PriceFeedOffer(
+                    target=utm,
+                    option_id=option.id,
+                    text=offer_template.render({
+                        'option': option,
+                        'url': cls.get_url(option, utm, root_slugs),
+                        'base_url': settings.BASE_URL,
+                    }),
+                )
+                for option in chunk
+            )
+
+    @classmethod
+    def generate_yml(cls, utm: str) -> typing.Iterator[str]:
+        """Assemble yml file content from the stored offers by chunks."""
+        head, tail = render_to_string('ecommerce/prices/price.yml', {
             'base_url': settings.BASE_URL,
-            'categories': categories,
-            'options': options,
-            'utm_urls': utm_urls(options),
+            'categories': Category.objects.all(),
             'shop': settings.SHOP,
             'utm': utm,
-        }
+            'offers_placeholder': cls.OFFERS_PLACEHOLDER,
+        }).strip().split(cls.OFFERS_PLACEHOLDER)
+
+        offers = (
+            PriceFeedOffer.objects
+            .filter(target=utm)
+            .order_by('option_id')
+            .values_list('text', flat=True)
+        )
+        yield head
+        for chunk in chunked(offers.iterator(), cls.CHUNK_SIZE):
+            yield ''.join(chunk)
+        yield tail
 
     @staticmethod
-    def write_yml(file_to_write, context):
-        """Write generated context to file."""
-        with open(file_to_write, 'w', encoding='utf-8') as file:
-            file.write(render_to_string('ecommerce/prices/price.yml', context).strip())
+    def write_yml(file_to_write: str, chunks: typing.Iterable[str]):
+        """Write generated chunks to file. A web server never serves a half-written file."""
+        write_atomic(file_to_write, chunks)
+
+    @classmethod
+    def copy_to_static(cls, file_path: str):
+        """Copy the file to the static root instead of the whole `collectstatic` run."""
+        with open(file_path, encoding='utf-8') as file:
+            cls.write_yml(
+                os.path.join(settings.STATIC_ROOT, os.path.basename(file_path)),
+                file,
+            )
@@ -0,0 +1,11 @@
+"""Render sitemaps to files at `settings.SITEMAPS_DIR`."""
+
+from django.core.management.base import BaseCommand
+
+from stroyprombeton import sitemaps
+
+
+class Command(BaseCommand):
+
+    def handle(self, *args, **options):
+        sitemaps.generate()
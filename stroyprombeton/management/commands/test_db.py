@@ -162,6 +162,16 @@ class Command(BaseCommand):
             '--natural-primary',
             '-e',
             'sites',
+            # category closure is built by the categories saving signal
+            '-e',
+            'stroyprombeton.CategoryClosure',
+            # price feed tables are the command's runtime data
+            '-e',
+            'stroyprombeton.PriceFeedChange',
+            '-e',
+            'stroyprombeton.PriceFeedOffer',
+            '-e',
+            'stroyprombeton.PageModification',
             output='stroyprombeton/fixtures/dump.json'
         )
 
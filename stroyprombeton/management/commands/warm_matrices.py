@@ -0,0 +1,15 @@
+"""
+Build series and sections matrices into the cache. Run it after deploys.
+
+The cache is shared by all the web workers, so the first visitors get built matrices.
+"""
+
+from django.core.management.base import BaseCommand
+
+from stroyprombeton import matrix
+
+
+class Command(BaseCommand):
+
+    def handle(self, *args, **options):
+        matrix.warm()
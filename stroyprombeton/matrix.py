@@ -0,0 +1,72 @@
+"""
+Series and sections matrix pages data.
+
+Matrices are column-partitioned lists of non empty series and sections.
+They are built once and kept in the cache until the catalog changes.
+Signals at `stroyprombeton.signals` bump the matrices version.
+"""
+
+import typing
+
+from django.conf import settings
+from django.core.cache import cache
+
+from stroyprombeton import models as stb_models, versions
+
+# version invalidates the matrices, so the timeout only cleans the cache
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+class Item(typing.NamedTuple):
+    name: str
+    url: str
+
+
+class Matrix(typing.NamedTuple):
+    qs: typing.Callable[[], typing.Iterable]
+    columns: int
+
+
+MATRICES = {
+    'series': Matrix(
+        qs=lambda: stb_models.Series.objects.bind_fields().exclude_empty().order_by('name'),
+        columns=settings.SERIES_MATRIX_COLUMNS_COUNT,
+    ),
+    'sections': Matrix(
+        qs=lambda: stb_models.Section.objects.bind_fields().exclude_empty().order_by('name'),
+        columns=settings.SECTIONS_MATRIX_COLUMNS_COUNT,
+    ),
+}
+
+
+def partition(items: list, columns: int) -> typing.List[list]:
+    """Partition items to the columns by given columns count."""
+    column_length = len(items) // columns + 1
+    return [
+        items[i:i + column_length]
+        for i in range(0, len(items), column_length)
+    ]
+
+
+def build(name: str) -> typing.List[typing.List[Item]]:
+    matrix = MATRICES[name]
+    items = [Item(entity.name, entity.url) for entity in matrix.qs()]
+    return partition(items, matrix.columns)
+
+
+def get_key(name: str) -> str:
+    return f'matrix:{name}:{versions.get(versions.MATRIX)}'
+
+
+def get(name: str) -> typing.List[typing.List[Item]]:
+    key = get_key(name)
+    parted_items = cache.get(key)
+    if parted_items is None:
+        parted_items = build(name)
+        cache.set(key, parted_items, CACHE_TIMEOUT)
+    return parted_items
+
+
+def warm():
+    for name in MATRICES:
+        cache.set(get_key(name), build(name), CACHE_TIMEOUT)
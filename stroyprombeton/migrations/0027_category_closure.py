@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2019-07-15 10:12
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_closure(apps, schema_editor):
+    Category = apps.get_model('stroyprombeton', 'Category')
+    CategoryClosure = apps.get_model('stroyprombeton', 'CategoryClosure')
+
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+
+    def closure_rows(id_):
+        ancestor_id, depth = id_, 0
+        while ancestor_id:
+            yield CategoryClosure(
+                ancestor_id=ancestor_id, descendant_id=id_, depth=depth,
+            )
+            ancestor_id, depth = parents[ancestor_id], depth + 1
+
+    CategoryClosure.objects.bulk_create(
+        row for id_ in parents for row in closure_rows(id_)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stroyprombeton', '0026_create_section'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_closures', to='stroyprombeton.Category')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_closures', to='stroyprombeton.Category')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='categoryclosure',
+            unique_together=set([('ancestor', 'descendant')]),
+        ),
+        migrations.RunPython(fill_closure, migrations.RunPython.noop),
+    ]
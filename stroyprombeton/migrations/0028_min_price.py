@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2019-07-16 08:41
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+OPTIONS_LOOKUPS = {
+    'Category': 'product__category__ancestor_closures__ancestor',
+    'Series': 'series',
+    'Section': 'product__section',
+}
+
+
+def fill_min_prices(apps, schema_editor):
+    Option = apps.get_model('stroyprombeton', 'Option')
+    for model_name, lookup in OPTIONS_LOOKUPS.items():
+        min_prices = (
+            Option.objects
+            .filter(product__page__is_active=True, **{lookup: models.OuterRef('pk')})
+            .order_by()
+            .values(lookup)
+            .annotate(min_price=models.Min('price'))
+            .values('min_price')
+        )
+        apps.get_model('stroyprombeton', model_name).objects.update(
+            min_price=Coalesce(
+                models.Subquery(min_prices, output_field=models.FloatField()), 0.0
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stroyprombeton', '0027_category_closure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='min_price',
+            field=models.FloatField(default=0, editable=False, verbose_name='min price'),
+        ),
+        migrations.AddField(
+            model_name='section',
+            name='min_price',
+            field=models.FloatField(default=0, editable=False, verbose_name='min price'),
+        ),
+        migrations.AddField(
+            model_name='series',
+            name='min_price',
+            field=models.FloatField(default=0, editable=False, verbose_name='min price'),
+        ),
+        migrations.RunPython(fill_min_prices, migrations.RunPython.noop),
+    ]
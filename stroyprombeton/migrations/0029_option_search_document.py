@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2019-07-18 12:27
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+CONFIG = 'russian'
+
+
+def fill_documents(apps, schema_editor):
+    Option = apps.get_model('stroyprombeton', 'Option')
+    OptionSearchDocument = apps.get_model('stroyprombeton', 'OptionSearchDocument')
+
+    tag_names = defaultdict(list)
+    for option_id, tag_name in Option.tags.through.objects.values_list('option_id', 'tag__name'):
+        tag_names[option_id].append(tag_name)
+
+    options = Option.objects.values_list(
+        'id', 'product__name', 'mark', 'code', 'series__name',
+    )
+    OptionSearchDocument.objects.bulk_create(
+        OptionSearchDocument(
+            option_id=id_,
+            text=' '.join(filter(None, [
+                name, mark, str(code or ''), series_name or '', *tag_names[id_],
+            ])),
+        )
+        for id_, name, mark, code, series_name in options.iterator()
+    )
+    OptionSearchDocument.objects.update(vector=SearchVector('text', config=CONFIG))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stroyprombeton', '0028_min_price'),
+    ]
+
+    operations = [
+        migrations.RunSQL('CREATE EXTENSION IF NOT EXISTS pg_trgm', migrations.RunSQL.noop),
+        migrations.CreateModel(
+            name='OptionSearchDocument',
+            fields=[
+                ('option', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='stroyprombeton.Option')),
+                ('text', models.TextField(default='')),
+                ('vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='optionsearchdocument',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['vector'], name='option_search_vector_gin'),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX stroyprombeton_optionsearchdocument_text_trgm '
+            'ON stroyprombeton_optionsearchdocument USING gin (UPPER(text) gin_trgm_ops)',
+            'DROP INDEX stroyprombeton_optionsearchdocument_text_trgm',
+        ),
+        migrations.RunPython(fill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2019-07-22 10:14
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stroyprombeton', '0029_option_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceFeedChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('option_id', models.IntegerField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PriceFeedOffer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(max_length=10)),
+                ('option_id', models.IntegerField()),
+                ('text', models.TextField()),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='pricefeedoffer',
+            unique_together=set([('target', 'option_id')]),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2019-07-24 16:02
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0018_page_template_increase_name_size'),
+        ('stroyprombeton', '0030_price_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageModification',
+            fields=[
+                ('page', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='modification', serialize=False, to='pages.Page')),
+                ('modified', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
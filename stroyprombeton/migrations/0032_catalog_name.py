@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2019-07-29 11:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, Concat
+
+
+def fill_catalog_names(apps, schema_editor):
+    Category = apps.get_model('stroyprombeton', 'Category')
+    Option = apps.get_model('stroyprombeton', 'Option')
+    Product = apps.get_model('stroyprombeton', 'Product')
+
+    product_names = Product.objects.filter(id=models.OuterRef('product_id')).values('name')
+    Option.objects.update(catalog_name=Concat(
+        models.Subquery(product_names, output_field=models.CharField()),
+        models.Value(' '),
+        'mark',
+        output_field=models.CharField(),
+    ))
+
+    series_names = (
+        Option.objects
+        .filter(product_id=models.OuterRef('pk'))
+        .order_by('id')
+        .values('series__name')[:1]
+    )
+    category_names = Category.objects.filter(id=models.OuterRef('category_id')).values('name')
+    Product.objects.update(catalog_name=Concat(
+        'name',
+        models.Value('. '),
+        Coalesce(
+            models.Subquery(series_names, output_field=models.CharField()),
+            models.Subquery(category_names, output_field=models.CharField()),
+        ),
+        output_field=models.CharField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stroyprombeton', '0031_page_modification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='option',
+            name='catalog_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=1000, verbose_name='catalog name'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='catalog_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=1000, verbose_name='catalog name'),
+        ),
+        migrations.RunPython(fill_catalog_names, migrations.RunPython.noop),
+    ]
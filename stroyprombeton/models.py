@@ -1,8 +1,12 @@
 import string
 import typing
+from itertools import chain
 
 import mptt
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Concat
 from django.urls import reverse
 from django.utils.text import slugify
 from django.utils.translation import ugettext_lazy as _
@@ -18,10 +22,11 @@ class Order(ecommerce.models.Order):
     address = models.TextField(default='', blank=True, verbose_name='address')
     comment = models.TextField(default='', blank=True, verbose_name='comment')
 
+    @transaction.atomic
     def set_positions(self, cart):
         self.save()
-        for id_, position in cart:
-            self.positions.create(
+        self.positions.model.objects.bulk_create([
+            self.positions.model(
                 order=self,
                 product_id=id_,
                 name=position['name'],
@@ -31,9 +36,53 @@ class Order(ecommerce.models.Order):
                 catalog_name=position['catalog_name'],
                 url=position['url'],
             )
+            for id_, position in cart
+        ])
         return self
 
 
+class MinPriceMixin(models.Model):
+    """
+    Stores min price of the entity's active options.
+
+    Signals at `stroyprombeton.signals` refresh it on options changes.
+    `min_prices` command recomputes it for all entities.
+    """
+
+    # lookup from Option to the entity
+    OPTIONS_LOOKUP = ''
+
+    class Meta:
+        abstract = True
+
+    min_price = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name=_('min price'),
+    )
+
+    @classmethod
+    def update_min_prices(cls, entities: models.QuerySet = None):
+        """Recompute min prices for the given entities with a single query."""
+        entities = cls.objects.all() if entities is None else entities
+        min_prices = (
+            Option.objects
+            .active()
+            .filter(**{cls.OPTIONS_LOOKUP: models.OuterRef('pk')})
+            .order_by()
+            .values(cls.OPTIONS_LOOKUP)
+            .annotate(min_price=models.Min('price'))
+            .values('min_price')
+        )
+        entities.update(min_price=Coalesce(
+            models.Subquery(min_prices, output_field=models.FloatField()), 0.0
+        ))
+
+    def get_min_price(self) -> float:
+        """Helper for templates."""
+        return self.min_price
+
+
 # @todo #rf169 Fix model.Manager inheritance problem
 #  Category model ignores parent's manager.
 #  ```
@@ -45,7 +94,10 @@ class Order(ecommerce.models.Order):
 #  Should be `catalog.models.CategoryManager`
 #
 #  Then use model.Manager.active() filter everywhere in this project (rf#169).
-class Category(catalog.models.AbstractCategory, pages.models.PageMixin):
+class Category(catalog.models.AbstractCategory, pages.models.PageMixin, MinPriceMixin):
+
+    OPTIONS_LOOKUP = 'product__category__ancestor_closures__ancestor'
+
     # @todo #483:30m  Explore `Category.specification` field purpose.
     #  Then document or rename it.
     specification = models.TextField(
@@ -70,38 +122,65 @@ class Category(catalog.models.AbstractCategory, pages.models.PageMixin):
         return (
             Series.objects
             .prefetch_related('options')
-            .filter(
-                options__in=models.Subquery(
-                    Option.objects
-                    .select_related('product')
-                    .select_related('product__category')
-                    .filter(
-                        product__in=Product.objects.filter_descendants(self)
-                    ).values('id')
-                )
-            ).distinct()
+            .filter(id__in=Option.objects.filter_descendants(self).values('series_id'))
             .order_by('name')
         )
 
     def get_sections(self) -> models.QuerySet:
         return (
             Section.objects
-            .filter(products__in=models.Subquery(
-                Product.objects
-                .select_related('category')
-                .filter_descendants(self)
-                .values('id')
-            ))
-            .distinct()
+            .filter(id__in=Product.objects.filter_descendants(self).values('section_id'))
             .order_by('name')
         )
 
     def recursive_products(self) -> 'ProductQuerySet':
         return Product.objects.filter_descendants(self)
 
-    def get_min_price(self) -> float:
-        """Helper for templates."""
-        return self.recursive_products().options().min_price()
+
+class CategoryClosureManager(models.Manager):
+
+    def rebuild(self, category: Category):
+        """
+        Rebuild the closure rows for the category subtree.
+
+        Subtree nodes and their ancestors are taken by MPTT fields,
+        so the method works for partially loaded trees too. Fixtures for example.
+        """
+        subtree = list(category.get_descendants(include_self=True))
+        ancestors = list(category.get_ancestors())
+        self.filter(descendant__in=subtree).delete()
+        self.bulk_create(
+            self.model(ancestor=ancestor, descendant=node, depth=node.level - ancestor.level)
+            for node in subtree
+            for ancestor in chain(ancestors, subtree)
+            if ancestor.lft <= node.lft and node.rght <= ancestor.rght
+        )
+
+
+class CategoryClosure(models.Model):
+    """
+    Denormalized Category tree.
+
+    Contains a row for every (ancestor, descendant) pair, including category itself.
+    Signals at `stroyprombeton.signals` keep it synced with the categories MPTT tree.
+    """
+
+    objects = CategoryClosureManager()
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+
+    ancestor = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='descendant_closures',
+    )
+    descendant = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='ancestor_closures',
+    )
+    depth = models.PositiveIntegerField()
 
 
 class SeriesQuerySet(models.QuerySet):
@@ -128,7 +207,7 @@ class SeriesManager(models.Manager.from_queryset(SeriesQuerySet)):
         return self.get_queryset().active()
 
 
-class Series(pages.models.PageMixin):
+class Series(pages.models.PageMixin, MinPriceMixin):
     """
     Series is another way to organize products.
 
@@ -137,6 +216,8 @@ class Series(pages.models.PageMixin):
 
     objects = SeriesManager()
 
+    OPTIONS_LOOKUP = 'series'
+
     SLUG_HASH_SIZE = 5
     SLUG_MAX_LENGTH = 50
 
@@ -185,10 +266,6 @@ class Series(pages.models.PageMixin):
             hash_size=self.SLUG_HASH_SIZE
         )
 
-    def get_min_price(self) -> float:
-        """Helper for templates."""
-        return self.options.min_price()
-
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = self._get_slug()
@@ -222,7 +299,7 @@ class SectionManager(models.Manager.from_queryset(SectionQuerySet)):
         return self.get_queryset().active()
 
 
-class Section(pages.models.PageMixin):
+class Section(pages.models.PageMixin, MinPriceMixin):
     """
     Group of products created by product type principle.
 
@@ -231,6 +308,8 @@ class Section(pages.models.PageMixin):
 
     objects = SectionManager()
 
+    OPTIONS_LOOKUP = 'product__section'
+
     SLUG_HASH_SIZE = 5
     SLUG_MAX_LENGTH = 50
 
@@ -257,10 +336,6 @@ class Section(pages.models.PageMixin):
     def seo_name(self):
         return self.name + ' железобетонные'
 
-    def get_min_price(self) -> float:
-        """Helper for templates."""
-        return self.products.options().min_price()
-
 
 class OptionQuerySet(models.QuerySet):
 
@@ -271,12 +346,15 @@ class OptionQuerySet(models.QuerySet):
         """Prefetch or select typical related fields to reduce sql queries count."""
         return (
             self.select_related('product')
+            .select_related('product__page')
             .select_related('series')
             .prefetch_related('tags')
         )
 
     def filter_descendants(self, category: models.Model) -> models.QuerySet:
-        return self.filter(product__category__in=category.get_descendants(True))
+        # Category closure has the only row for every (ancestor, descendant) pair,
+        # so the join doesn't require distinct.
+        return self.filter(product__category__ancestor_closures__ancestor=category)
 
     def tagged(self, tags: 'TagQuerySet'):
         # Distinct because a relation of tags and products is M2M.
@@ -300,6 +378,35 @@ class OptionQuerySet(models.QuerySet):
         min_price = self.aggregate(min_price=models.Min('price'))['min_price']
         return min_price or 0.0
 
+    def search(self, term: str) -> 'OptionQuerySet':
+        """
+        Search options by the search documents.
+
+        Substring matching uses the trigram index,
+        whole words matching uses the tsvector index.
+        """
+        term = term.strip()
+        query = SearchQuery(term, config=OptionSearchDocument.CONFIG)
+        return (
+            self.filter(
+                models.Q(search_document__text__icontains=term)
+                | models.Q(search_document__vector=query)
+            )
+            .annotate(
+                is_name_start_by_term=models.Case(
+                    models.When(product__name__istartswith=term, then=models.Value(True)),
+                    default=models.Value(False),
+                    output_field=models.BooleanField(),
+                ),
+                rank=SearchRank(models.F('search_document__vector'), query),
+            )
+            .order_by(
+                models.F('is_name_start_by_term').desc(),
+                models.F('rank').desc(),
+                'product__name',
+            )
+        )
+
 
 class OptionManager(models.Manager.from_queryset(OptionQuerySet)):
     """Get all products of given category by Category's id or instance."""
@@ -369,15 +476,136 @@ class Option(catalog.models.AbstractOption):
         db_index=True,
         verbose_name=_('is popular'),
     )
+    # Signals at `stroyprombeton.signals` refresh it on the option and product changes.
+    # `catalog_names` command recomputes it for all options.
+    catalog_name = models.CharField(
+        default='',
+        max_length=1000,
+        db_index=True,
+        editable=False,
+        verbose_name=_('catalog name'),
+    )
 
-    @property
-    def catalog_name(self) -> str:
-        return f'{self.name} {self.mark}'
+    @classmethod
+    def update_catalog_names(cls, options: models.QuerySet = None):
+        """Recompute catalog names for the given options with a single query."""
+        options = cls.objects.all() if options is None else options
+        product_names = (
+            Product.objects
+            .filter(id=models.OuterRef('product_id'))
+            .values('name')
+        )
+        options.update(catalog_name=Concat(
+            models.Subquery(product_names, output_field=models.CharField()),
+            models.Value(' '),
+            'mark',
+            output_field=models.CharField(),
+        ))
 
     def __str__(self):
         return self.mark  # Ignore CPDBear
 
 
+class OptionSearchDocumentManager(models.Manager):
+
+    def update_options(self, options: OptionQuerySet):
+        """Rebuild search documents for the given options."""
+        options = list(
+            options
+            .select_related('product', 'series')
+            .prefetch_related('tags')
+        )
+        documents = self.filter(option__in=options)
+        documents.delete()
+        self.bulk_create(
+            self.model(option=option, text=self.model.get_text(option))
+            for option in options
+        )
+        documents.update(vector=SearchVector('text', config=self.model.CONFIG))
+
+
+class OptionSearchDocument(models.Model):
+    """
+    Denormalized option's text data for the full text search.
+
+    Signals at `stroyprombeton.signals` keep it synced with options.
+    """
+
+    CONFIG = 'russian'
+
+    objects = OptionSearchDocumentManager()
+
+    class Meta:
+        indexes = [GinIndex(fields=['vector'], name='option_search_vector_gin')]
+        # `text` field has trigram GIN index too.
+        # Django 1.11 can't declare index opclasses, so see the migration.
+
+    option = models.OneToOneField(
+        Option,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document',
+    )
+    text = models.TextField(default='')
+    vector = SearchVectorField(null=True)
+
+    @staticmethod
+    def get_text(option: Option) -> str:
+        """Option's text to search by. Option should have all the related fields fetched."""
+        return ' '.join(filter(None, [
+            option.product.name,
+            option.mark,
+            str(option.code or ''),
+            option.series.name if option.series else '',
+            *(tag.name for tag in option.tags.all()),
+        ]))
+
+
+class PriceFeedChangeManager(models.Manager):
+
+    def mark(self, option_ids: typing.Iterable[int]):
+        self.bulk_create(self.model(option_id=id_) for id_ in set(option_ids))
+
+    def mark_all(self):
+        self.create(option_id=None)
+
+    def changed(self) -> typing.Dict[int, typing.Optional[int]]:
+        """
+        Map the change ids to the changed option ids.
+
+        `None` option id means the whole feed is changed.
+        """
+        return dict(self.values_list('id', 'option_id'))
+
+    def forget(self, change_ids: typing.Iterable[int]):
+        # don't delete changes created after the `changed` call
+        self.filter(id__in=list(change_ids)).delete()
+
+
+class PriceFeedChange(models.Model):
+    """
+    Option changed since the last price feed update.
+
+    Signals at `stroyprombeton.signals` mark the changes.
+    """
+
+    objects = PriceFeedChangeManager()
+
+    # not FK, because deleted options should be removed from the feed too
+    option_id = models.IntegerField(null=True)
+
+
+class PriceFeedOffer(models.Model):
+    """Rendered price feed offer. The price command assembles a feed file from them."""
+
+    class Meta:
+        unique_together = ('target', 'option_id')
+
+    target = models.CharField(max_length=10)
+    option_id = models.IntegerField()
+    text = models.TextField()
+
+
 class ProductQuerySet(catalog.models.ProductQuerySet):
 
     # @todo #597:60m  Implement `ProductQuerySet.get_series` method.
@@ -386,6 +614,9 @@ class ProductQuerySet(catalog.models.ProductQuerySet):
     def get_series(self):
         pass
 
+    def filter_descendants(self, category: Category) -> 'ProductQuerySet':
+        return self.filter(category__ancestor_closures__ancestor=category)
+
     def options(self) -> OptionQuerySet:
         return Option.objects.filter(product__in=self).distinct()
 
@@ -423,6 +654,14 @@ class Product(catalog.models.AbstractProduct, pages.models.PageMixin):
         verbose_name=_('section'),
         null=True,
     )
+    # the same as `Option.catalog_name`
+    catalog_name = models.CharField(
+        default='',
+        max_length=1000,
+        db_index=True,
+        editable=False,
+        verbose_name=_('catalog name'),
+    )
 
     def __str__(self):
         return self.name
@@ -435,10 +674,30 @@ class Product(catalog.models.AbstractProduct, pages.models.PageMixin):
     def parent(self):
         return self.category or None
 
-    @property
-    def catalog_name(self) -> str:
-        suffix_model = self.options.first().series or self.category
-        return f'{self.name}. {suffix_model.name}'
+    @classmethod
+    def update_catalog_names(cls, products: models.QuerySet = None):
+        """
+        Recompute catalog names for the given products with a single query.
+
+        Name is suffixed with the first option's series or with the product category.
+        """
+        products = cls.objects.all() if products is None else products
+        series_names = (
+            Option.objects
+            .filter(product_id=models.OuterRef('pk'))
+            .order_by('id')
+            .values('series__name')[:1]
+        )
+        category_names = Category.objects.filter(id=models.OuterRef('category_id')).values('name')
+        products.update(catalog_name=Concat(
+            'name',
+            models.Value('. '),
+            Coalesce(
+                models.Subquery(series_names, output_field=models.CharField()),
+                models.Subquery(category_names, output_field=models.CharField()),
+            ),
+            output_field=models.CharField(),
+        ))
 
     def get_absolute_url(self):
         return reverse('product', args=(self.id,))
@@ -485,6 +744,22 @@ class Product(catalog.models.AbstractProduct, pages.models.PageMixin):
     )
 
 
+class PageModification(models.Model):
+    """
+    Last modification time of a page. Sitemaps show it.
+
+    `pages.Page` has no such field, so signals at `stroyprombeton.signals` keep it.
+    """
+
+    page = models.OneToOneField(
+        pages.models.Page,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='modification',
+    )
+    modified = models.DateTimeField(auto_now=True)
+
+
 class CategoryPage(pages.models.ModelPage):
     """Proxy model for Admin."""
 
@@ -0,0 +1,94 @@
+"""
+Category price lists in PDF.
+
+wkhtmltopdf renders a price list for seconds, so price lists are rendered
+by a Celery task to a file cache. File name contains the category id
+and the category version. Signals bump the version on the category options changes,
+so a changed price list gets a new file. The outdated files are removed after rendering.
+Web and Celery containers share the files directory.
+"""
+
+import glob
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from wkhtmltopdf.utils import render_pdf_from_template
+
+from catalog import context
+from pages import context as pages_context
+from stroyprombeton import context as stb_context, models as stb_models, versions
+from stroyprombeton.helpers import write_atomic
+
+TEMPLATE = 'catalog/product_pdf_price.html'
+# rendering task should finish for this time
+RENDERING_TIMEOUT = 10 * 60
+# polls don't restart a failed rendering for this time
+FAILURE_TIMEOUT = 60
+
+
+def get_path(category: stb_models.Category) -> str:
+    return os.path.join(
+        settings.PDF_PRICES_DIR,
+        f'{category.id}-{versions.get_category(category.id)}.pdf',
+    )
+
+
+def remove(category: stb_models.Category, keep=''):
+    """Remove the category price lists files except the kept one."""
+    for path in glob.glob(os.path.join(settings.PDF_PRICES_DIR, f'{category.id}-*.pdf')):
+        if path != keep:
+            os.remove(path)
+
+
+def get_context(category: stb_models.Category) -> dict:
+    options_ = stb_context.options.CategoryFiltered(
+        stb_context.options.All(),
+        category
+    )
+    grouped_tags = context.tags.GroupedTags(
+        tags=stb_context.TagsByOptions(
+            stb_context.tags.All(),
+            options_.qs(),
+        )
+    )
+    return {
+        **pages_context.Contexts([
+            options_, grouped_tags,
+        ]).context(),
+        'base_url': settings.BASE_URL,
+        'category': category,
+    }
+
+
+def render(category: stb_models.Category, path='') -> str:
+    """
+    Render the category price list to the file cache and return the file path.
+
+    Task receives the path from the view, so it renders exactly the polled file.
+    """
+    path = path or get_path(category)
+    content = render_pdf_from_template(
+        get_template(TEMPLATE), None, None, get_context(category),
+    )
+    write_atomic(path, [content], mode='wb')
+    remove(category, keep=path)
+    return path
+
+
+def start_rendering(category: stb_models.Category) -> bool:
+    """Mark the price list as rendering. Return False if it's rendering already."""
+    return cache.add(f'pdf_rendering:{get_path(category)}', True, RENDERING_TIMEOUT)
+
+
+def finish_rendering(path: str):
+    cache.delete(f'pdf_rendering:{path}')
+
+
+def fail_rendering(path: str):
+    cache.set(f'pdf_failed:{path}', True, FAILURE_TIMEOUT)
+
+
+def is_failed(path: str) -> bool:
+    return cache.get(f'pdf_failed:{path}', False)
@@ -1,9 +1,10 @@
 import typing
 
 from django import http
-from django_user_agents.utils import get_user_agent
+from django.core import signing
 
 from pages.request_data import Request
+from stroyprombeton import devices
 from stroyprombeton.exception import Http400
 
 
@@ -18,10 +19,9 @@ class Category(Request):
     @property
     def length(self):
         """Max size of products list depends on the device type."""
-        is_mobile = get_user_agent(self.request).is_mobile
         return (
             self.PRODUCTS_ON_PAGE_MOB
-            if is_mobile else self.PRODUCTS_ON_PAGE_PC
+            if devices.get(self.request).is_mobile else self.PRODUCTS_ON_PAGE_PC
         )
 
     @property
@@ -40,6 +40,7 @@ class Category(Request):
 
 
 class FetchProducts(Category):
+    CURSOR_SALT = 'fetch-products-cursor'
 
     def __init__(
         self, request: http.HttpRequest, url_kwargs: typing.Dict[str, str]
@@ -69,3 +70,19 @@ class FetchProducts(Category):
     @property
     def length(self):
         return int(self.request.POST.get('limit', self.PRODUCTS_ON_PAGE_PC))
+
+    @property
+    def cursor(self) -> typing.Optional[list]:
+        """Ordering key values of the last fetched option."""
+        cursor = self.request.POST.get('cursor', '')
+        if not cursor:
+            return None
+        try:
+            return signing.loads(cursor, salt=self.CURSOR_SALT)
+        except signing.BadSignature:
+            raise Http400('POST param cursor is broken')
+
+    @classmethod
+    def dump_cursor(cls, values: list) -> str:
+        """Opaque cursor for the client side."""
+        return signing.dumps(values, salt=cls.CURSOR_SALT)
@@ -0,0 +1,107 @@
+"""
+Search page query.
+
+All searched entities are ranked by one UNION query instead of
+a trigram similarity query per entity.
+Then only found entities are fetched by their ids.
+"""
+
+import typing
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import models
+from django.db.models.functions import Greatest
+
+from pages.models import CustomPage, FlatPage
+from stroyprombeton import models as stb_models
+
+
+class Entity(typing.NamedTuple):
+    name: str
+    qs: models.QuerySet
+    field: str
+    # is entity searchable by it's id
+    by_id: bool = False
+    select_related: tuple = ('page',)
+
+
+# entities are ordered like groups at the results page
+ENTITIES = [
+    Entity('category', stb_models.Category.objects.active(), 'name'),
+    Entity('series', stb_models.Series.objects.active(), 'name'),
+    Entity('product', stb_models.Product.objects.active(), 'name', by_id=True),
+    Entity(
+        'option', stb_models.Option.objects.active(), 'mark',
+        select_related=('product__page',),
+    ),
+    Entity('custom_page', CustomPage.objects.active(), 'name', select_related=()),
+    Entity('flat_page', FlatPage.objects.active(), 'name', select_related=()),
+]
+
+
+def similarity(entity: Entity, term: str) -> models.Expression:
+    trigram = TrigramSimilarity(entity.field, term)
+    if not (entity.by_id and term.isdigit()):
+        return trigram
+    return Greatest(
+        trigram,
+        models.Case(
+            models.When(id=int(term), then=models.Value(1.0)),
+            default=models.Value(0.0),
+            output_field=models.FloatField(),
+        ),
+    )
+
+
+def ranked_ids(term: str, limit: int) -> typing.List[typing.Tuple[str, int]]:
+    """Return the most similar to the term `(entity name, id)` pairs by one query."""
+    ranked = [
+        entity.qs
+        .order_by()
+        .annotate(
+            entity=models.Value(entity.name, output_field=models.CharField()),
+            similarity=similarity(entity, term),
+        )
+        .filter(similarity__gt=settings.TRIGRAM_MIN_SIMILARITY)
+        .values_list('id', 'entity', 'similarity')
+        for entity in ENTITIES
+    ]
+    first, *rest = ranked
+    return [
+        (entity, id_)
+        for id_, entity, _ in first.union(*rest, all=True).order_by('-similarity')[:limit]
+    ]
+
+
+def search(term: str, limit: int) -> list:
+    """
+    Search entities by the term.
+
+    Results are grouped by entities and ordered by similarity inside a group.
+    """
+    term = term.strip()
+    if not term:
+        return []
+
+    ranked = ranked_ids(term, limit)
+    ids = defaultdict(list)
+    for entity, id_ in ranked:
+        ids[entity].append(id_)
+
+    found = {}
+    for entity in ENTITIES:
+        if ids[entity.name]:
+            qs = entity.qs.model.objects.filter(id__in=ids[entity.name])
+            if entity.select_related:
+                qs = qs.select_related(*entity.select_related)
+            found.update({(entity.name, item.id): item for item in qs})
+
+    order = {entity.name: i for i, entity in enumerate(ENTITIES)}
+    return [
+        found[key]
+        # sort is stable, so similarity order is kept inside a group
+        for key in sorted(ranked, key=lambda key: order[key[0]])
+        if key in found
+    ]
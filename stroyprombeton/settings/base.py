@@ -79,7 +79,7 @@ MIDDLEWARE = [
     'django.contrib.redirects.middleware.RedirectFallbackMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
-    'django_user_agents.middleware.UserAgentMiddleware',
+    'stroyprombeton.devices.DeviceMiddleware',
     'refarm_redirects.middleware.RedirectAllMiddleware',
 ]
 
@@ -101,6 +101,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'ecommerce.context_processors.cart',
                 'stroyprombeton.context_processors.site_info',
+                'stroyprombeton.context_processors.device',
             ],
             'debug': DEBUG,
         },
@@ -148,6 +149,14 @@ FORMAT_MODULE_PATH = [
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 ASSETS_DIR = os.path.join(BASE_DIR, 'assets')
+# the `sitemaps` command renders sitemaps here
+SITEMAPS_DIR = os.path.join(STATIC_ROOT, 'sitemaps')
+# category price lists in PDF are cached here. See `stroyprombeton.pdf`
+PDF_PRICES_DIR = os.path.join(BASE_DIR, 'pdf_prices')
+# `parse_stalbeton` command caches responses and stores parsed entities here
+STALBETON_DB = os.path.join(BASE_DIR, 'stalbeton.sqlite3')
+# emails are spooled here if Celery broker is unavailable. See `stroyprombeton.mailer`
+MAIL_SPOOL_DIR = os.path.join(BASE_DIR, 'mail_spool')
 
 STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
 
@@ -179,6 +188,23 @@ DATABASES = {
    }
 }
 
+# All web and celery processes share the cache.
+# Data versions at `stroyprombeton.versions` rely on it.
+REDIS_URL = os.environ.get('REDIS_URL', 'redis')
+REDIS_PORT = os.environ.get('REDIS_PORT', 6379)
+REDIS_LOCATION_DEFAULT = os.environ.get('REDIS_LOCATION_DEFAULT', 0)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': f'redis://{REDIS_URL}:{REDIS_PORT}/{REDIS_LOCATION_DEFAULT}',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'PASSWORD': os.environ.get('REDIS_PASSWORD') or None,
+        },
+    },
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -421,7 +447,13 @@ TAGS_UI_LIMIT = 20
 # then will be shown neighbors by number: 3, 4, 6, 7
 PAGINATION_NEIGHBORS = 10
 CATEGORY_STEP_MULTIPLIERS = [12, 15, 24, 25, 48, 50, 60, 100]
-OPTIONS_ORDERING = ['code', 'product__name', 'mark']
+# `id` is the unique tie-breaker. Keyset pagination requires it.
+OPTIONS_ORDERING = ['code', 'product__name', 'mark', 'id']
+# options count is cached for every category, tags and search term combination
+OPTIONS_COUNT_CACHE_TIMEOUT = 10 * 60
+# catalog contexts cache options and tags ids with the categories versions.
+# Versions invalidate ids, so the timeout only cleans the cache.
+CATALOG_IDS_CACHE_TIMEOUT = 24 * 60 * 60
 PRODUCT_SIBLINGS_COUNT = 10
 
 SERIES_MATRIX_COLUMNS_COUNT = 4
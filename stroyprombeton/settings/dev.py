@@ -16,6 +16,14 @@ SITE_DOMAIN_NAME = 'stage.stroyprombeton.ru'
 
 USE_CELERY = False
 
+# Tests run in parallel processes, clear the cache and roll back DB changes.
+# So every process keeps its own cache instead of the shared Redis one.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
 def show_toolbar(request):
     # Display debug toolbar when running on development config
     # With exception for test environment
@@ -0,0 +1,67 @@
+"""
+Product siblings.
+
+Siblings are active products of the same series.
+Product page shows a few of them with their main images.
+Siblings are cached by the series versions, that signals bump on the series changes.
+"""
+
+import hashlib
+import typing
+
+from django.conf import settings
+from django.core.cache import cache
+
+from images.models import Image
+from stroyprombeton import models as stb_models, versions
+
+# versions invalidate siblings, so the timeout only cleans the cache
+CACHE_TIMEOUT = 24 * 60 * 60
+
+Sibling = typing.Tuple[stb_models.Product, typing.Optional[Image]]
+
+
+def get_series_ids(product: stb_models.Product) -> typing.List[int]:
+    """Get series of the product's active options."""
+    # Options are active only with the active product page.
+    # So the page is checked instead of the `options.active()` query,
+    # because options are prefetched by the product page view.
+    if not product.page.is_active:
+        return []
+    return sorted({o.series_id for o in product.options.all() if o.series_id})
+
+
+def fetch(series_ids: typing.List[int], count: int) -> typing.List[Sibling]:
+    """Fetch distinct siblings ordered by name with their main images by two queries."""
+    siblings = list(
+        stb_models.Product.objects
+        .active()
+        .filter(options__series_id__in=series_ids)
+        .select_related('page')
+        .distinct()
+        .order_by('name')
+        [:count]
+    )
+    images = Image.objects.get_main_images_by_pages(
+        sibling.page for sibling in siblings
+    )
+    return [(sibling, images.get(sibling.page)) for sibling in siblings]
+
+
+def get_key(series_ids: typing.List[int]) -> str:
+    key = ','.join(f'{id_}:{versions.get_series(id_)}' for id_ in series_ids)
+    return f'siblings:{hashlib.sha1(key.encode()).hexdigest()}'
+
+
+def get(
+    product: stb_models.Product, count=settings.PRODUCT_SIBLINGS_COUNT,
+) -> typing.List[Sibling]:
+    series_ids = get_series_ids(product)
+    if not series_ids:
+        return []
+    key = f'{get_key(series_ids)}:{count}'
+    siblings = cache.get(key)
+    if siblings is None:
+        siblings = fetch(series_ids, count)
+        cache.set(key, siblings, CACHE_TIMEOUT)
+    return siblings
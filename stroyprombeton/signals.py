@@ -0,0 +1,563 @@
+import typing
+from functools import lru_cache
+
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from images.models import Image
+from pages.models import Page
+from stroyprombeton import autocomplete, models as stb_models, versions
+
+
+# MPTT moves nodes with `save` call, so `post_save` covers moves too.
+# Deleted categories lose their closure rows by the FK cascade.
+@receiver(post_save, sender=stb_models.Category)
+def sync_category_closure(sender, instance, created, raw, **kwargs):
+    parent_ids = set(
+        stb_models.CategoryClosure.objects
+        .filter(descendant=instance, depth=1)
+        .values_list('ancestor_id', flat=True)
+    )
+    is_moved = parent_ids != ({instance.parent_id} if instance.parent_id else set())
+    if not (created or raw or is_moved):
+        return
+
+    old_ancestor_ids = list(
+        stb_models.CategoryClosure.objects
+        .filter(descendant=instance)
+        .values_list('ancestor_id', flat=True)
+    )
+    stb_models.CategoryClosure.objects.rebuild(instance)
+    if is_moved and not created:
+        # the old and the new ancestors cache options of the moved subtree
+        versions.bump_categories(old_ancestor_ids)
+        bump_categories_versions([instance.id])
+        # and their min prices include the subtree options
+        stb_models.Category.update_min_prices(
+            stb_models.Category.objects.filter(id__in=[
+                *old_ancestor_ids,
+                *stb_models.CategoryClosure.objects
+                .filter(descendant=instance)
+                .values_list('ancestor_id', flat=True),
+            ])
+        )
+
+
+def update_min_prices(
+    product_ids: typing.Iterable[int], series_ids: typing.Iterable[int]
+):
+    """Refresh min prices of all entities related with the given products and series."""
+    products = stb_models.Product.objects.filter(id__in=set(product_ids))
+    stb_models.Category.update_min_prices(
+        stb_models.Category.objects.filter(id__in=(
+            stb_models.CategoryClosure.objects
+            .filter(descendant__products__in=products)
+            .values('ancestor_id')
+        ))
+    )
+    stb_models.Section.update_min_prices(
+        stb_models.Section.objects.filter(id__in=products.values('section_id'))
+    )
+    stb_models.Series.update_min_prices(
+        stb_models.Series.objects.filter(id__in=set(filter(None, series_ids)))
+    )
+
+
+def remember_fields(instance, fields: typing.List[str]):
+    """Keep the stored values of the instance fields to compare them after saving."""
+    instance._stored_fields = (
+        type(instance).objects.filter(id=instance.id).values(*fields).first()
+        if instance.id else None
+    ) or {}
+
+
+def changed_fields(instance, fields: typing.List[str]) -> typing.Dict[str, typing.Any]:
+    """Map changed instance fields to their old values."""
+    stored = getattr(instance, '_stored_fields', {})
+    return {
+        field: stored.get(field)
+        for field in fields
+        if stored.get(field) != getattr(instance, field)
+    }
+
+
+@lru_cache(maxsize=None)
+def get_related_model_name(model: typing.Type) -> str:
+    return model().related_model_name
+
+
+def is_page_of(instance, models: typing.Iterable[typing.Type]) -> bool:
+    """Check if the instance is a page of one of the given models entities."""
+    return (
+        isinstance(instance, Page)
+        and instance.related_model_name in {get_related_model_name(model) for model in models}
+    )
+
+
+def is_product_page(instance) -> bool:
+    return is_page_of(instance, [stb_models.Product])
+
+
+OPTION_PRICE_FIELDS = ['price', 'product_id', 'series_id']
+PRODUCT_PRICE_FIELDS = ['category_id', 'section_id']
+# Fields rendered at the price feed offers.
+# Offers contain product pages images too.
+# Untracked changes are rendered by the daily full feed rebuild.
+OPTION_FEED_FIELDS = ['price', 'in_stock', 'mark', 'product_id']
+PRODUCT_FEED_FIELDS = ['name', 'price', 'category_id']
+# fields indexed by the autocomplete
+AUTOCOMPLETE_FIELDS = {
+    stb_models.Category: ['name'],
+    stb_models.Option: ['mark', 'code', 'product_id'],
+    stb_models.Product: ['name'],
+}
+AUTOCOMPLETE_PAGE_FIELDS = ['slug', 'is_active']
+# menu shows only series and sections with active products
+MENU_OPTION_FIELDS = ['product_id', 'series_id']
+MENU_PRODUCT_FIELDS = ['section_id']
+# fields of the option search document
+SEARCH_OPTION_FIELDS = ['product_id', 'mark', 'code', 'series_id']
+
+
+@receiver(pre_save, sender=stb_models.Option)
+def remember_option_fields(sender, instance, raw, **kwargs):
+    if not raw:
+        remember_fields(instance, list({
+            *OPTION_PRICE_FIELDS, *OPTION_FEED_FIELDS, *MENU_OPTION_FIELDS,
+            *SEARCH_OPTION_FIELDS, *AUTOCOMPLETE_FIELDS[stb_models.Option],
+        }))
+
+
+@receiver(post_save, sender=stb_models.Option)
+def update_option_min_prices(sender, instance, raw, **kwargs):
+    changed = {} if raw else changed_fields(instance, OPTION_PRICE_FIELDS)
+    if changed:
+        update_min_prices(
+            product_ids=[instance.product_id, changed.get('product_id')],
+            series_ids=[instance.series_id, changed.get('series_id')],
+        )
+
+
+@receiver(post_delete, sender=stb_models.Option)
+def update_deleted_option_min_prices(sender, instance, **kwargs):
+    update_min_prices([instance.product_id], [instance.series_id])
+
+
+@receiver(pre_save, sender=stb_models.Product)
+def remember_product_fields(sender, instance, raw, **kwargs):
+    if not raw:
+        remember_fields(instance, list({
+            *PRODUCT_PRICE_FIELDS, *PRODUCT_FEED_FIELDS, *MENU_PRODUCT_FIELDS,
+            *AUTOCOMPLETE_FIELDS[stb_models.Product],
+        }))
+
+
+@receiver(post_save, sender=stb_models.Product)
+def update_product_min_prices(sender, instance, raw, **kwargs):
+    changed = {} if raw else changed_fields(instance, PRODUCT_PRICE_FIELDS)
+    if not changed:
+        return
+    # a moved product leaves its old category and section
+    stb_models.Category.update_min_prices(
+        stb_models.Category.objects.filter(id__in=(
+            stb_models.CategoryClosure.objects
+            .filter(descendant_id=changed.get('category_id'))
+            .values('ancestor_id')
+        ))
+    )
+    stb_models.Section.update_min_prices(
+        stb_models.Section.objects.filter(id=changed.get('section_id'))
+    )
+    update_min_prices([instance.id], instance.options.values_list('series_id', flat=True))
+
+
+# Pages models are proxies, so receivers can't filter them by the sender.
+# Only pages of these models have fields tracked by signals.
+TRACKED_PAGES_MODELS = [
+    stb_models.Category, stb_models.Product, stb_models.Series, stb_models.Section,
+]
+
+
+@receiver(pre_save)
+def remember_page_fields(sender, instance, raw, **kwargs):
+    if not raw and is_page_of(instance, TRACKED_PAGES_MODELS):
+        remember_fields(instance, ['is_active', 'slug', 'position'])
+
+
+@receiver(post_save)
+def update_page_min_prices(sender, instance, raw, **kwargs):
+    """Options of inactive product pages are out of the min prices."""
+    if raw or not is_product_page(instance) or not changed_fields(instance, ['is_active']):
+        return
+    products = stb_models.Product.objects.filter(page=instance)
+    update_min_prices(
+        products.values_list('id', flat=True),
+        stb_models.Option.objects.filter(product__in=products).values_list('series_id', flat=True),
+    )
+
+
+@receiver(post_save, sender=stb_models.Option)
+def mark_option_feed_change(sender, instance, raw, created, **kwargs):
+    if raw or created or changed_fields(instance, OPTION_FEED_FIELDS):
+        stb_models.PriceFeedChange.objects.mark([instance.id])
+
+
+@receiver(post_delete, sender=stb_models.Option)
+def mark_deleted_option_feed_change(sender, instance, **kwargs):
+    stb_models.PriceFeedChange.objects.mark([instance.id])
+
+
+@receiver(post_save, sender=stb_models.Product)
+def mark_product_feed_change(sender, instance, raw, **kwargs):
+    if not raw and changed_fields(instance, PRODUCT_FEED_FIELDS):
+        stb_models.PriceFeedChange.objects.mark(
+            instance.options.values_list('id', flat=True)
+        )
+
+
+@receiver(post_save)
+def mark_page_feed_change(sender, instance, raw, **kwargs):
+    if not raw and is_product_page(instance) and changed_fields(instance, ['is_active']):
+        stb_models.PriceFeedChange.objects.mark(
+            stb_models.Option.objects
+            .filter(product__page=instance)
+            .values_list('id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def mark_image_feed_change(sender, instance, **kwargs):
+    if is_product_page(instance.model):
+        stb_models.PriceFeedChange.objects.mark(
+            stb_models.Option.objects
+            .filter(product__page=instance.model)
+            .values_list('id', flat=True)
+        )
+
+
+# Categories are at the feed head and at the offers urls.
+# They are rarely changed, so the whole feed is rebuilt on their changes.
+@receiver(post_save, sender=stb_models.Category)
+@receiver(post_delete, sender=stb_models.Category)
+def mark_category_feed_change(sender, **kwargs):
+    stb_models.PriceFeedChange.objects.mark_all()
+
+
+# Fixtures loading saves options with `raw` flag after their products, series and tags.
+# So search documents are built for them too.
+@receiver(post_save, sender=stb_models.Option)
+def update_option_search_document(sender, instance, raw, created, **kwargs):
+    if not (raw or created or changed_fields(instance, SEARCH_OPTION_FIELDS)):
+        return
+    stb_models.OptionSearchDocument.objects.update_options(
+        stb_models.Option.objects.filter(id=instance.id)
+    )
+
+
+@receiver(m2m_changed, sender=stb_models.Option.tags.through)
+def update_tagged_options_search_documents(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # tag loses its options, so remember them
+        instance._cleared_option_ids = list(instance.options.values_list('id', flat=True))
+    if action not in {'post_add', 'post_remove', 'post_clear'}:
+        return
+
+    if not reverse:
+        option_ids = [instance.id]
+    elif action == 'post_clear':
+        option_ids = instance._cleared_option_ids
+    else:
+        option_ids = pk_set
+    stb_models.OptionSearchDocument.objects.update_options(
+        stb_models.Option.objects.filter(id__in=option_ids)
+    )
+
+
+@receiver(post_save, sender=stb_models.Product)
+@receiver(post_save, sender=stb_models.Series)
+@receiver(post_save, sender=stb_models.Tag)
+def update_related_options_search_documents(sender, instance, raw, created, **kwargs):
+    if not (raw or created):
+        stb_models.OptionSearchDocument.objects.update_options(instance.options.all())
+
+
+# Deletion removes relations without m2m signals, so remember the related options.
+@receiver(pre_delete, sender=stb_models.Series)
+@receiver(pre_delete, sender=stb_models.Tag)
+def remember_deleted_options(sender, instance, **kwargs):
+    instance._deleted_option_ids = list(instance.options.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=stb_models.Series)
+@receiver(post_delete, sender=stb_models.Tag)
+def update_deleted_options_search_documents(sender, instance, **kwargs):
+    # options of a deleted series are deleted too, so they are skipped
+    stb_models.OptionSearchDocument.objects.update_options(
+        stb_models.Option.objects.filter(id__in=instance._deleted_option_ids)
+    )
+
+
+@receiver(post_save, sender=stb_models.Category)
+@receiver(post_save, sender=stb_models.Option)
+@receiver(post_save, sender=stb_models.Product)
+def invalidate_autocomplete(sender, instance, raw, created, **kwargs):
+    if raw or created or changed_fields(instance, AUTOCOMPLETE_FIELDS[sender]):
+        autocomplete.invalidate()
+
+
+@receiver(post_delete, sender=stb_models.Category)
+@receiver(post_delete, sender=stb_models.Option)
+@receiver(post_delete, sender=stb_models.Product)
+def invalidate_deleted_autocomplete(sender, **kwargs):
+    autocomplete.invalidate()
+
+
+@receiver(post_save)
+def invalidate_page_autocomplete(sender, instance, raw, **kwargs):
+    if (
+        not raw
+        and is_page_of(instance, [stb_models.Category, stb_models.Product])
+        and changed_fields(instance, AUTOCOMPLETE_PAGE_FIELDS)
+    ):
+        autocomplete.invalidate()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_catalog_versions(sender, **kwargs):
+    # matrices show non empty series and sections.
+    # Options version is for the whole options list.
+    catalog_models = (
+        stb_models.Category, stb_models.Series, stb_models.Section,
+        stb_models.Option, stb_models.Product, Page,
+    )
+    if issubclass(sender, catalog_models):
+        versions.bump(versions.MATRIX)
+        versions.bump(versions.OPTIONS)
+
+
+# menu shows names and urls of the active categories, series and sections
+MENU_FIELDS = ['name']
+MENU_PAGE_FIELDS = ['slug', 'position', 'is_active']
+
+
+@receiver(pre_save, sender=stb_models.Category)
+@receiver(pre_save, sender=stb_models.Series)
+@receiver(pre_save, sender=stb_models.Section)
+def remember_menu_fields(sender, instance, raw, **kwargs):
+    if not raw:
+        remember_fields(instance, list({*MENU_FIELDS, *AUTOCOMPLETE_FIELDS.get(sender, [])}))
+
+
+@receiver(post_save, sender=stb_models.Category)
+@receiver(post_save, sender=stb_models.Series)
+@receiver(post_save, sender=stb_models.Section)
+def bump_menu_version(sender, instance, raw, created, **kwargs):
+    if raw or created or changed_fields(instance, MENU_FIELDS):
+        versions.bump(versions.MENU)
+
+
+@receiver(post_delete, sender=stb_models.Category)
+@receiver(post_delete, sender=stb_models.Series)
+@receiver(post_delete, sender=stb_models.Section)
+def bump_deleted_menu_version(sender, **kwargs):
+    versions.bump(versions.MENU)
+
+
+@receiver(post_save)
+def bump_menu_page_version(sender, instance, raw, **kwargs):
+    menu_models = [stb_models.Category, stb_models.Series, stb_models.Section]
+    if (
+        not raw
+        and is_page_of(instance, menu_models)
+        and changed_fields(instance, MENU_PAGE_FIELDS)
+    ):
+        versions.bump(versions.MENU)
+
+
+@receiver(post_save, sender=stb_models.Option)
+def bump_option_menu_version(sender, instance, raw, created, **kwargs):
+    if raw or created or changed_fields(instance, MENU_OPTION_FIELDS):
+        versions.bump(versions.MENU)
+
+
+@receiver(post_save, sender=stb_models.Product)
+def bump_product_menu_version(sender, instance, raw, created, **kwargs):
+    if raw or created or changed_fields(instance, MENU_PRODUCT_FIELDS):
+        versions.bump(versions.MENU)
+
+
+@receiver(post_delete, sender=stb_models.Option)
+@receiver(post_delete, sender=stb_models.Product)
+def bump_deleted_product_menu_version(sender, **kwargs):
+    versions.bump(versions.MENU)
+
+
+@receiver(post_save)
+def bump_product_page_menu_version(sender, instance, raw, **kwargs):
+    if not raw and is_product_page(instance) and changed_fields(instance, ['is_active']):
+        versions.bump(versions.MENU)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_pages_version(sender, **kwargs):
+    if issubclass(sender, (stb_models.Category, Page)):
+        versions.bump(versions.PAGES)
+
+
+@receiver(post_save)
+def save_page_modification(sender, instance, raw, **kwargs):
+    if isinstance(instance, Page) and not raw:
+        # saving with the existing primary key updates the `auto_now` field
+        stb_models.PageModification(page=instance).save()
+
+
+def bump_categories_versions(category_ids: typing.Iterable[int]):
+    """Bump versions of the given categories and their ancestors."""
+    versions.bump_categories(
+        stb_models.CategoryClosure.objects
+        .filter(descendant_id__in=set(filter(None, category_ids)))
+        .values_list('ancestor_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=stb_models.Option)
+@receiver(post_delete, sender=stb_models.Option)
+def bump_option_categories_versions(sender, instance, **kwargs):
+    # option could be moved from another product
+    moved_from = getattr(instance, '_stored_fields', {}).get('product_id')
+    bump_categories_versions(
+        stb_models.Product.objects
+        .filter(id__in=filter(None, [instance.product_id, moved_from]))
+        .values_list('category_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=stb_models.Product)
+@receiver(post_delete, sender=stb_models.Product)
+def bump_product_categories_versions(sender, instance, **kwargs):
+    moved_from = getattr(instance, '_stored_fields', {}).get('category_id')
+    bump_categories_versions([instance.category_id, moved_from])
+
+
+@receiver(post_save)
+def bump_product_page_categories_versions(sender, instance, raw, **kwargs):
+    if not raw and is_product_page(instance):
+        bump_categories_versions(
+            stb_models.Product.objects
+            .filter(page=instance)
+            .values_list('category_id', flat=True)
+        )
+
+
+def bump_products_series_versions(products: stb_models.ProductQuerySet):
+    """Bump versions of the given products series to refresh their siblings."""
+    versions.bump_series(
+        stb_models.Option.objects
+        .filter(product__in=products, series__isnull=False)
+        .values_list('series_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=stb_models.Option)
+@receiver(post_delete, sender=stb_models.Option)
+def bump_option_series_versions(sender, instance, **kwargs):
+    moved_from = getattr(instance, '_stored_fields', {}).get('series_id')
+    versions.bump_series(filter(None, [instance.series_id, moved_from]))
+
+
+@receiver(post_save, sender=stb_models.Series)
+def bump_series_version(sender, instance, **kwargs):
+    versions.bump_series([instance.id])
+
+
+@receiver(post_save, sender=stb_models.Product)
+def bump_product_series_versions(sender, instance, **kwargs):
+    bump_products_series_versions(stb_models.Product.objects.filter(id=instance.id))
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_product_page_series_versions(sender, instance, **kwargs):
+    """Siblings show product pages and their main images."""
+    page = instance.model if isinstance(instance, Image) else instance
+    if is_product_page(page):
+        bump_products_series_versions(stb_models.Product.objects.filter(page=page))
+
+
+def update_products_catalog_names(product_ids: typing.Iterable[int]):
+    stb_models.Product.update_catalog_names(
+        stb_models.Product.objects.filter(id__in=set(filter(None, product_ids)))
+    )
+
+
+# Own catalog name is updated on every save,
+# because `save` writes the instance's outdated value.
+# Fixtures have no catalog names, so they are updated at fixtures loading too.
+@receiver(post_save, sender=stb_models.Option)
+def update_option_catalog_names(sender, instance, raw, created, **kwargs):
+    stb_models.Option.update_catalog_names(stb_models.Option.objects.filter(id=instance.id))
+    changed = changed_fields(instance, ['product_id', 'series_id'])
+    if raw or created or changed:
+        # the first option of the product could be changed
+        update_products_catalog_names([instance.product_id, changed.get('product_id')])
+
+
+@receiver(post_delete, sender=stb_models.Option)
+def update_deleted_option_catalog_names(sender, instance, **kwargs):
+    update_products_catalog_names([instance.product_id])
+
+
+@receiver(post_save, sender=stb_models.Product)
+def update_product_catalog_names(sender, instance, raw, **kwargs):
+    update_products_catalog_names([instance.id])
+    if raw or 'name' in changed_fields(instance, ['name']):
+        stb_models.Option.update_catalog_names(instance.options.all())
+
+
+@receiver(post_save, sender=stb_models.Series)
+def update_series_catalog_names(sender, instance, **kwargs):
+    stb_models.Product.update_catalog_names(
+        stb_models.Product.objects.filter(
+            id__in=instance.options.values('product_id'),
+        )
+    )
+
+
+@receiver(post_save, sender=stb_models.Category)
+def update_category_catalog_names(sender, instance, **kwargs):
+    stb_models.Product.update_catalog_names(instance.products.all())
+
+
+def bump_options_categories_versions(options: stb_models.OptionQuerySet):
+    bump_categories_versions(options.values_list('product__category_id', flat=True))
+
+
+# catalog contexts cache tags ids and filter options by tags
+@receiver(m2m_changed, sender=stb_models.Option.tags.through)
+def bump_tagged_options_categories_versions(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        instance._cleared_categories_option_ids = list(
+            instance.options.values_list('id', flat=True)
+        )
+    if action not in {'post_add', 'post_remove', 'post_clear'}:
+        return
+
+    if not reverse:
+        option_ids = [instance.id]
+    elif action == 'post_clear':
+        option_ids = instance._cleared_categories_option_ids
+    else:
+        option_ids = pk_set
+    bump_options_categories_versions(stb_models.Option.objects.filter(id__in=option_ids))
+
+
+@receiver(post_save, sender=stb_models.Tag)
+@receiver(pre_delete, sender=stb_models.Tag)
+def bump_tag_categories_versions(sender, instance, **kwargs):
+    # tag slugs filter options and tag names order them
+    bump_options_categories_versions(instance.options.all())
@@ -1,47 +1,68 @@
-from datetime import datetime
+"""
+Sitemaps are pre-rendered to files by the `sitemaps` command.
+
+Sitemaps with more than `Sitemap.limit` urls are split to several files.
+"""
+
+import os
+import typing
+from urllib.parse import urlparse
 
 from django.conf import settings
 from django.contrib.sitemaps import Sitemap
+from django.db import models
+from django.db.models.functions import Coalesce
+from django.template.loader import render_to_string
 
 from pages.models import CustomPage, FlatPage, ModelPage
+from stroyprombeton import models as stb_models
+from stroyprombeton.helpers import write_atomic
 
 # @todo #396:60m Adapt sitemaps for Option model.
 
 
+def with_lastmod(qs: models.QuerySet, page_lookup='') -> models.QuerySet:
+    """Annotate the pages or the page related entities with the last modification time."""
+    return qs.annotate(lastmod=Coalesce(
+        f'{page_lookup}modification__modified',
+        f'{page_lookup}date_published',
+        output_field=models.DateTimeField(),
+    ))
+
+
 class AbstractSitemap(Sitemap):
     protocol = settings.PROTOCOL
     changefreq = 'weekly'
     priority = 0.9
 
+    def lastmod(self, item):
+        return item.lastmod
 
-class IndexSitemap(Sitemap):
-    protocol = settings.PROTOCOL
+
+class IndexSitemap(AbstractSitemap):
     changefreq = 'monthly'
     priority = 1
 
     def items(self):
-        return CustomPage.objects.filter(slug='')
-
-    def lastmod(self, _):
-        return datetime.now()
+        return with_lastmod(CustomPage.objects.filter(slug=''))
 
 
 class FlatPagesSitemap(AbstractSitemap):
 
     def items(self):
-        return FlatPage.objects.active()
+        return with_lastmod(FlatPage.objects.active())
 
 
 class CustomPagesSitemap(AbstractSitemap):
 
     def items(self):
-        return CustomPage.objects.active().exclude(slug='')
+        return with_lastmod(CustomPage.objects.active().exclude(slug=''))
 
 
 class ProductPagesSitemap(AbstractSitemap):
 
     def items(self):
-        return (
+        return with_lastmod(
             ModelPage.objects
             .select_related('stroyprombeton_product')
             .active()
@@ -52,9 +73,78 @@ class ProductPagesSitemap(AbstractSitemap):
 class CategoryPagesSitemap(AbstractSitemap):
 
     def items(self):
-        return (
+        return with_lastmod(
             ModelPage.objects
             .select_related('stroyprombeton_category')
             .active()
             .filter(stroyprombeton_category__isnull=False)
         )
+
+
+class SeriesSitemap(AbstractSitemap):
+
+    def items(self):
+        return with_lastmod(
+            stb_models.Series.objects.exclude_empty().order_by('id'),
+            page_lookup='page__',
+        )
+
+
+class SectionsSitemap(AbstractSitemap):
+
+    def items(self):
+        return with_lastmod(
+            stb_models.Section.objects.bind_fields().exclude_empty().order_by('id'),
+            page_lookup='page__',
+        )
+
+
+SITEMAPS = {
+    'categories': CategoryPagesSitemap,
+    'custom-pages': CustomPagesSitemap,
+    'index': IndexSitemap,
+    'flat-pages': FlatPagesSitemap,
+    'products': ProductPagesSitemap,
+    'series': SeriesSitemap,
+    'sections': SectionsSitemap,
+}
+INDEX_FILE = 'sitemap.xml'
+
+
+class Domain(typing.NamedTuple):
+    """Sitemap requires a site object for urls. Domain comes from settings instead of db."""
+
+    domain: str
+
+
+def get_file_name(section: str, page: int) -> str:
+    return f'sitemap-{section}.xml' if page == 1 else f'sitemap-{section}-{page}.xml'
+
+
+def generate(directory=settings.SITEMAPS_DIR):
+    """Render all sitemaps and their index to the directory."""
+    site = Domain(urlparse(settings.BASE_URL).netloc)
+    file_names = []
+    for section, sitemap_class in SITEMAPS.items():
+        sitemap = sitemap_class()
+        for page in sitemap.paginator.page_range:
+            file_name = get_file_name(section, page)
+            write_atomic(
+                os.path.join(directory, file_name),
+                [render_to_string('sitemap.xml', {
+                    'urlset': sitemap.get_urls(page=page, site=site),
+                })],
+            )
+            file_names.append(file_name)
+
+    write_atomic(
+        os.path.join(directory, INDEX_FILE),
+        [render_to_string('sitemap_index.xml', {
+            'sitemaps': [f'{settings.BASE_URL}/{name}' for name in file_names],
+        })],
+    )
+
+    # sections could become shorter
+    for name in set(os.listdir(directory)) - {INDEX_FILE, *file_names}:
+        if name.startswith('sitemap-'):
+            os.remove(os.path.join(directory, name))
@@ -2,11 +2,50 @@ from __future__ import absolute_import, unicode_literals
 
 from django.core.management import call_command
 
+from stroyprombeton import mailer, models, pdf
 from stroyprombeton.celery import app
 
 
 @app.task
 def update_prices():
-    call_command('price')
+    call_command('price', incremental=True, static=True)
     print('Generate prices complete.')
-    call_command('collectstatic', '--no-input')
+
+
+@app.task
+def rebuild_prices():
+    call_command('price', static=True)
+
+
+@app.task
+def generate_sitemaps():
+    call_command('sitemaps')
+
+
+@app.task
+def render_pdf_price(category_id: int, path: str):
+    try:
+        pdf.render(models.Category.objects.get(id=category_id), path)
+    except Exception:
+        pdf.fail_rendering(path)
+        raise
+    finally:
+        pdf.finish_rendering(path)
+
+
+# a task per message, so a failed message doesn't resend the sent ones
+@app.task(bind=True, max_retries=5)
+def send_mail(self, message: dict):
+    try:
+        mailer.send([message])
+    except Exception as error:
+        if self.request.retries >= self.max_retries:
+            # flush_mail_spool task sends it later
+            mailer.spool([message])
+            raise
+        raise self.retry(exc=error, countdown=2 ** self.request.retries * 60)
+
+
+@app.task
+def flush_mail_spool():
+    mailer.flush_spool()
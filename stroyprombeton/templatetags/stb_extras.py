@@ -6,7 +6,7 @@ from django.template.defaultfilters import floatformat
 
 from images.models import ImageMixin
 from pages.models import Page
-from stroyprombeton import models as stb_models
+from stroyprombeton import models as stb_models, versions
 
 register = template.Library()
 
@@ -41,6 +41,11 @@ def format_price(price):
         return 'По запросу'
 
 
+@register.simple_tag
+def get_menu_version():
+    return versions.get(versions.MENU)
+
+
 @register.simple_tag
 def get_top_menu_categories():
     return (
@@ -92,16 +97,6 @@ def get_img_alt(entity: ImageMixin):
     return product_alt.format(entity_name)
 
 
-# @todo #500:60m  Improve tags table performance clearly.
-#  Drop `get_tag_name` template tag. It spawns O(n) queries to DB.
-#  Prepare tags structure at the view side instead.
-#  This approach requires just few queries.
-@register.simple_tag
-def get_tag_name(group, option) -> str:
-    tag = stb_models.Tag.objects.filter(group=group, options__in=[option]).first()
-    return tag.name if tag else ''
-
-
 @register.filter
 def remove_specification(value, specification):
     replace_pattern = '. {}'.format(specification)
@@ -1,9 +1,10 @@
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase, tag
 from django.urls import reverse
 
 from pages.models import FlatPage
-from stroyprombeton.models import CategoryPage, ProductPage
+from stroyprombeton.models import CategoryPage, Option, ProductPage
 
 
 @tag('fast')
@@ -139,3 +140,35 @@ class AdminPage(TestCase):
 
         for field in self.fieldsets['page']:
             self.assertContains(response, field)
+
+
+@tag('fast')
+class OptionsCSV(TestCase):
+
+    fixtures = ['dump.json']
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rows(self):
+        response = self.client.get('/options.csv')
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(Option.objects.active().count(), len(rows))
+
+        option = Option.objects.active().first()
+        self.assertIn(f'{option.url};{option.product.name} {option.mark}', rows)
+
+    def test_etag(self):
+        """Admin tool should skip the download if options are not changed."""
+        etag = self.client.get('/options.csv')['ETag']
+        self.assertEqual(
+            304, self.client.get('/options.csv', HTTP_IF_NONE_MATCH=etag).status_code,
+        )
+
+        option = Option.objects.active().first()
+        option.price += 1
+        option.save()
+        self.assertEqual(
+            200, self.client.get('/options.csv', HTTP_IF_NONE_MATCH=etag).status_code,
+        )
+
@@ -1,13 +1,21 @@
 import os
+import shutil
+import socketserver
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
 from xml.etree import ElementTree
 
 from django.conf import settings
 from django.core.management import call_command
-from django.test import TestCase, tag
+from django.test import SimpleTestCase, TestCase, tag
 
 from pages.models import Page
+from stroyprombeton import crawler, sitemaps
+from stroyprombeton.management.commands import price
 from stroyprombeton.management.commands.seo_texts import populate_entities
-from stroyprombeton.models import Option, Product
+from stroyprombeton.models import Option, Product, Series
 
 
 @tag('fast')
@@ -58,6 +66,209 @@ class ImportTest(TestCase):
         site_cpa = self.pricelist_body.find('cpa').text
         self.assertTrue(site_cpa, 0)
 
+    def test_offers(self):
+        """Pricelist should contain an offer for every option with price."""
+        offers = self.pricelist_body.find('offers').findall('offer')
+        self.assertEqual(Option.objects.filter(price__gt=0).count(), len(offers))
+
+    def test_no_temporary_files(self):
+        """`price` command should leave the only result file at the assets dir."""
+        self.assertFalse(any(
+            name.endswith('.tmp') for name in os.listdir(settings.ASSETS_DIR)
+        ))
+
+
+@tag('fast')
+class IncrementalPrice(TestCase):
+
+    fixtures = ['dump.json']
+    FILE_PATH = os.path.join(settings.ASSETS_DIR, 'yandex.yml')
+
+    def setUp(self):
+        call_command('price')
+
+    def tearDown(self):
+        os.remove(self.FILE_PATH)
+
+    def get_offer_names(self) -> list:
+        offers = ElementTree.parse(self.FILE_PATH).getroot().find('shop').find('offers')
+        return [offer.find('name').text for offer in offers.findall('offer')]
+
+    def test_skip_without_changes(self):
+        modified = os.stat(self.FILE_PATH).st_mtime_ns
+        call_command('price', incremental=True)
+        self.assertEqual(modified, os.stat(self.FILE_PATH).st_mtime_ns)
+
+    def test_update_changed_offer(self):
+        option = Option.objects.filter(price__gt=0).first()
+        option.mark = 'new_mark'
+        option.save()
+        call_command('price', incremental=True)
+        self.assertIn(f'new_mark - {option.product.name}', self.get_offer_names())
+        self.assertEqual(
+            Option.objects.filter(price__gt=0).count(),
+            len(self.get_offer_names()),
+        )
+
+    def test_keep_changes_on_failure(self):
+        """Changes should be rendered again after the failed file writing."""
+        option = Option.objects.filter(price__gt=0).first()
+        option.mark = 'new_mark'
+        option.save()
+        with mock.patch.object(price.Command, 'write_yml', side_effect=OSError):
+            with self.assertRaises(OSError):
+                call_command('price', incremental=True)
+
+        call_command('price', incremental=True)
+        self.assertIn(f'new_mark - {option.product.name}', self.get_offer_names())
+
+
+@tag('fast')
+class Sitemaps(TestCase):
+
+    fixtures = ['dump.json']
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        sitemaps.generate(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_urls(self, file_name: str) -> list:
+        namespace = {'sitemap': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
+        root = ElementTree.parse(os.path.join(self.directory, file_name)).getroot()
+        return [loc.text for loc in root.findall('.//sitemap:loc', namespace)]
+
+    def test_index(self):
+        """Sitemaps index should refer every sitemap file."""
+        files = self.get_urls(sitemaps.INDEX_FILE)
+        self.assertEqual(
+            {f'{settings.BASE_URL}/{name}' for name in os.listdir(self.directory)}
+            - {f'{settings.BASE_URL}/{sitemaps.INDEX_FILE}'},
+            set(files),
+        )
+
+    def test_series(self):
+        urls = self.get_urls('sitemap-series.xml')
+        series = Series.objects.exclude_empty().first()
+        self.assertTrue(any(url.endswith(series.url) for url in urls))
+
+    def test_split(self):
+        """Sitemap should be split by the urls limit."""
+        with mock.patch.object(sitemaps.ProductPagesSitemap, 'limit', 2):
+            sitemaps.generate(self.directory)
+        self.assertEqual(2, len(self.get_urls('sitemap-products-2.xml')))
+
+
+CATEGORY_HTML = """
+<title>{name} title</title>
+<meta name="Description" content="{name} description">
+<h1>{name}</h1>
+<div id="js-category-description">{name} text</div>
+<h2><a class="catalog-list__link" href="{child}">child</a></h2>
+"""
+
+STALBETON_PAGES = {
+    '/': """
+        <div class="catalog-tabs-content__list">
+            <a class="catalog-list__link" href="/catalog/root">Root</a>
+        </div>
+    """,
+    '/catalog/root': CATEGORY_HTML.format(name='Root', child='/catalog/second'),
+    '/catalog/second': CATEGORY_HTML.format(name='Second', child='/catalog/third'),
+    '/catalog/third': CATEGORY_HTML.format(name='Third', child='/') + """
+        <div class="product-grid-list-item">
+            <a class="link_theme-line" href="/product/1">FB 24.4.6</a>
+            <span class="product-info-caption__item">Foundation block</span>
+            <a class="product-info-caption__link">1.116.1-8</a>
+            <span class="unit_price">1 200</span>
+        </div>
+    """,
+}
+
+
+class StalbetonHandler(BaseHTTPRequestHandler):
+    """Serve the stalbeton pages fixture and count the requests."""
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path not in STALBETON_PAGES:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = f'"{hash(STALBETON_PAGES[self.path])}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        content = STALBETON_PAGES[self.path].encode()
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class StalbetonServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@tag('fast')
+class ParseStalbeton(SimpleTestCase):
+
+    def setUp(self):
+        self.server = StalbetonServer(('127.0.0.1', 0), StalbetonHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.db = os.path.join(tempfile.mkdtemp(), 'stalbeton.sqlite3')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(os.path.dirname(self.db))
+
+    def parse(self):
+        host, port = self.server.server_address
+        call_command('parse_stalbeton', db=self.db, site_url=f'http://{host}:{port}')
+
+    def test_entities(self):
+        self.parse()
+        store = crawler.EntityStore(self.db)
+        self.assertEqual(
+            {'/catalog/root', '/catalog/second', '/catalog/third'},
+            set(store.all('category')),
+        )
+        self.assertEqual('Second text', store.all('category')['/catalog/second']['text'])
+        self.assertEqual(
+            {'name': 'FB 24.4.6', 'product_name': 'Foundation block',
+             'series': '1.116.1-8', 'price': 1200},
+            store.all('option')['/product/1'],
+        )
+
+    def test_page_loaded_once(self):
+        self.parse()
+        self.assertEqual(len(STALBETON_PAGES), len(self.server.requests))
+
+    def test_revalidation(self):
+        """Repeated crawl should take not modified pages from the cache."""
+        self.parse()
+        with mock.patch.object(crawler.ResponseCache, 'set') as set_response:
+            self.parse()
+        set_response.assert_not_called()
+        self.assertEqual(2 * len(STALBETON_PAGES), len(self.server.requests))
+        self.assertIn('/catalog/third', crawler.EntityStore(self.db).all('category'))
+
+    def test_fetch_error(self):
+        host, port = self.server.server_address
+        fetcher = crawler.Fetcher(f'http://{host}:{port}', crawler.ResponseCache(self.db))
+        with self.assertRaises(crawler.FetchError):
+            fetcher.fetch('/unknown')
+        fetcher.close()
+
 
 @tag('fast')
 class SeoTexts(TestCase):
@@ -1,8 +1,12 @@
+from unittest import mock
+
 from django.conf import settings
-from django.test import TestCase, tag
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, tag
 
 from catalog import context
-from stroyprombeton import models as stb_models
+from stroyprombeton import context as stb_context, facets, models as stb_models, versions
+from stroyprombeton.settings import base as base_settings
 
 
 @tag('fast')
@@ -30,3 +34,183 @@ class Pagination(TestCase):
         sliced, whole = set(sliced_options.products), set(options)
         # every `sliced` is contained in `whole`
         self.assertEqual(sliced, sliced.intersection(whole))
+
+
+class GivenOptions(stb_context.options.Options):
+    """Options of the given queryset with its ordering."""
+
+    def __init__(self, qs: stb_models.OptionQuerySet):
+        self._qs = qs
+
+    def qs(self) -> stb_models.OptionQuerySet:
+        return self._qs
+
+
+@tag('fast')
+class CachedIds(TestCase):
+
+    fixtures = ['dump.json']
+
+    def setUp(self):
+        cache.clear()
+        self.option = stb_models.Option.objects.active().first()
+        self.category = self.option.product.category
+
+    def get_cached(self) -> stb_context.options.Cached:
+        return stb_context.options.Cached(
+            stb_context.options.Filtered(self.category, stb_models.Tag.objects.none()),
+            self.category,
+            key=('',),
+        )
+
+    def test_same_options(self):
+        self.assertEqual(
+            list(stb_context.options.Filtered(
+                self.category, stb_models.Tag.objects.none()
+            ).qs()),
+            list(self.get_cached().qs()),
+        )
+
+    def test_cached(self):
+        self.get_cached().ids()
+        with self.assertNumQueries(0):
+            self.get_cached().ids()
+
+    def test_keep_order(self):
+        ids = list(
+            stb_models.Option.objects.filter_descendants(self.category)
+            .order_by('-id').values_list('id', flat=True)[:5]
+        )
+        cached = stb_context.options.Cached(
+            # `options.All` applies its own ordering, so keep the given one
+            GivenOptions(stb_models.Option.objects.filter(id__in=ids).order_by('-id')),
+            self.category,
+            key=('ordered',),
+            keep_order=True,
+        )
+        self.assertEqual(ids, [option.id for option in cached.qs()])
+
+    def test_edit_invalidates_only_subtree(self):
+        """Option edit should keep cached ids of unrelated categories."""
+        unrelated = (
+            stb_models.Category.objects
+            .exclude(id__in=self.category.get_ancestors(include_self=True))
+            .exclude(id__in=self.category.get_descendants())
+            .first()
+        )
+        versions_before = [versions.get_category(c.id) for c in (self.category, unrelated)]
+        self.option.price += 1
+        self.option.save()
+        self.assertNotEqual(versions_before[0], versions.get_category(self.category.id))
+        self.assertEqual(versions_before[1], versions.get_category(unrelated.id))
+
+    def test_tags_change_invalidates(self):
+        self.get_cached().ids()
+        version = versions.get_category(self.category.id)
+        self.option.tags.add(stb_models.Tag.objects.first())
+        self.assertNotEqual(version, versions.get_category(self.category.id))
+
+    def test_category_move_invalidates_ancestors(self):
+        """Category move should invalidate its old and new ancestors."""
+        old_parent = self.category.parent
+        new_parent = stb_models.Category.objects.exclude(tree_id=self.category.tree_id).first()
+        versions_before = [versions.get_category(c.id) for c in (old_parent, new_parent)]
+        self.category.move_to(new_parent)
+        self.assertNotEqual(versions_before[0], versions.get_category(old_parent.id))
+        self.assertNotEqual(versions_before[1], versions.get_category(new_parent.id))
+
+
+@tag('fast')
+class CachedPages(TestCase):
+
+    fixtures = ['dump.json']
+
+    def setUp(self):
+        cache.clear()
+        self.category = stb_models.Option.objects.active().first().product.category
+        self.filtered = stb_context.options.Filtered(
+            self.category, stb_models.Tag.objects.none()
+        )
+
+    def get_pages(self) -> stb_context.options.CachedPages:
+        return stb_context.options.CachedPages(self.filtered, self.category, key=('',))
+
+    def test_same_page(self):
+        self.assertEqual(list(self.filtered.qs()[1:3]), list(self.get_pages()[1:3]))
+        self.assertEqual(self.filtered.qs().count(), self.get_pages().count())
+
+    def test_cache_only_page_ids(self):
+        """Pages should fetch only their own options ids once."""
+        list(self.get_pages()[0:2])
+        self.get_pages().count()
+        with self.assertNumQueries(1):
+            self.get_pages().count()
+            list(self.get_pages()[0:2])  # fetch options by the cached ids
+
+
+@tag('fast')
+class Facets(TestCase):
+
+    fixtures = ['dump.json']
+
+    def setUp(self):
+        cache.clear()
+        self.category = (
+            stb_models.Option.objects.filter(tags__group__isnull=False)
+            .first().product.category.get_root()
+        )
+        self.options = stb_models.Option.objects.active().filter_descendants(self.category)
+
+    def test_counts(self):
+        pairs = facets.count(self.options)
+        self.assertTrue(pairs)
+        for group, tags in pairs:
+            for tag_ in tags:
+                self.assertEqual(group, tag_.group)
+                self.assertEqual(
+                    self.options.filter(tags=tag_).count(), tag_.options_count,
+                )
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            facets.count(self.options)
+
+    def test_cached(self):
+        tags = stb_models.Tag.objects.none()
+        facets.get(self.options, self.category, tags)
+        with self.assertNumQueries(0):
+            facets.get(self.options, self.category, tags)
+
+    def test_same_tags_key(self):
+        """Differently ordered selection of the same tags should share facets."""
+        ids = list(
+            stb_models.Tag.objects.filter(group__isnull=False).values_list('id', flat=True)[:2]
+        )
+        tags = stb_models.Tag.objects.filter(id__in=ids)
+        facets.get(self.options, self.category, tags.order_by('id'))
+        with mock.patch.object(facets, 'count') as count:
+            facets.get(self.options, self.category, tags.order_by('-id'))
+        count.assert_not_called()
+
+    def test_tags_change_invalidates(self):
+        tag_ = stb_models.Tag.objects.filter(group__isnull=False).first()
+
+        def get_counts():
+            pairs = facets.get(self.options, self.category, stb_models.Tag.objects.none())
+            return {t.id: t.options_count for _, tags in pairs for t in tags}
+
+        before = get_counts()
+        self.options.exclude(tags=tag_).first().tags.add(tag_)
+        after = get_counts()
+        self.assertEqual(before.get(tag_.id, 0) + 1, after[tag_.id])
+
+
+@tag('fast')
+class SharedCache(SimpleTestCase):
+    """Web and celery processes should see the same data versions."""
+
+    def test_redis_cache(self):
+        # dev settings keep a local cache for the parallel tests
+        self.assertEqual(
+            'django_redis.cache.RedisCache', base_settings.CACHES['default']['BACKEND'],
+        )
@@ -1,4 +1,9 @@
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Min
+from django.template.loader import render_to_string
 from django.test import TestCase, tag
+from django.test.utils import CaptureQueriesContext
 
 from pages import models as pages_models
 from stroyprombeton import models as stb_models
@@ -25,14 +30,76 @@ class Category_(TestCase):
         self.assertIn(product.section, least.get_sections())
         self.assertIn(product.section, root.get_sections())
 
+    def test_closure_follows_moves(self):
+        """Category closure should be synced with the category tree."""
+        def assert_synced(category):
+            self.assertEqual(
+                {
+                    (c.id, category.level - c.level)
+                    for c in category.get_ancestors(include_self=True)
+                },
+                set(
+                    stb_models.CategoryClosure.objects
+                    .filter(descendant=category)
+                    .values_list('ancestor_id', 'depth')
+                ),
+            )
+
+        leaf = (
+            stb_models.Category.objects
+            .filter(children__isnull=True, products__isnull=False)
+            .first()
+        )
+        assert_synced(leaf)
+
+        new_parent = stb_models.Category.objects.exclude(tree_id=leaf.tree_id).first()
+        leaf.move_to(new_parent)
+        leaf.refresh_from_db()
+        assert_synced(leaf)
+
+        option = stb_models.Option.objects.filter(product__category=leaf).first()
+        self.assertIn(option, stb_models.Option.objects.filter_descendants(new_parent))
+
     def test_min_price(self):
         """Non-leaf category should find min price recursively."""
-        option = stb_models.Option.objects.filter(price__gt=0).first()
+        call_command('min_prices')
+        option = stb_models.Option.objects.active().filter(price__gt=0).first()
         category = option.product.category.parent
-        self.assertNumQueries(1, category.get_min_price)
+        self.assertNumQueries(0, category.get_min_price)
         self.assertGreater(category.get_min_price(), 0)
         self.assertLessEqual(category.get_min_price(), option.price)
 
+    def test_min_price_follows_moves(self):
+        """Stored min prices of the old and new ancestors should follow a category move."""
+        call_command('min_prices')
+        option = stb_models.Option.objects.active().filter(price__gt=0).order_by('price').first()
+        leaf = option.product.category
+        old_root = leaf.get_root()
+        new_parent = stb_models.Category.objects.exclude(tree_id=leaf.tree_id).first()
+        leaf.move_to(new_parent)
+
+        new_parent.refresh_from_db()
+        self.assertLessEqual(new_parent.get_min_price(), option.price)
+        old_root.refresh_from_db()
+        self.assertEqual(
+            stb_models.Option.objects.active().filter_descendants(old_root)
+            .aggregate(Min('price'))['price__min'] or 0,
+            old_root.get_min_price(),
+        )
+
+    def test_min_price_follows_option_price(self):
+        """Stored min prices should be refreshed on an option price change."""
+        call_command('min_prices')
+        option = stb_models.Option.objects.active().filter(price__gt=0).first()
+        option.price = 0.5
+        option.save()
+
+        product = option.product
+        for entity in [product.category.get_root(), product.section, option.series]:
+            if entity:
+                entity.refresh_from_db()
+                self.assertEqual(0.5, entity.get_min_price())
+
 
 @tag('fast')
 class Section(TestCase):
@@ -41,9 +108,12 @@ class Section(TestCase):
 
     def test_min_price(self):
         """Non-leaf category should find min price recursively."""
-        option = stb_models.Option.objects.filter(price__gt=0).first()
+        call_command('min_prices')
+        option = stb_models.Option.objects.active().filter(
+            price__gt=0, product__section__isnull=False,
+        ).first()
         section = option.product.section
-        self.assertNumQueries(1, section.get_min_price)
+        self.assertNumQueries(0, section.get_min_price)
         self.assertGreater(section.get_min_price(), 0)
         self.assertLessEqual(section.get_min_price(), option.price)
 
@@ -77,3 +147,136 @@ class Option_(TestCase):
         self.get_min_price_test_box(in_prices=[], out_price=0.0)
         self.get_min_price_test_box(in_prices=[0.0], out_price=0.0)
         self.get_min_price_test_box(in_prices=[20.0, 10.0], out_price=10.0)
+
+    def test_search_document_follows_option(self):
+        """Option should be found by the new data right after saving."""
+        product = stb_models.Product.objects.create(
+            name='some_name',
+            category=stb_models.Category.objects.create(name='some_name'),
+            page=pages_models.Page.objects.create(name='some_name', is_active=True),
+        )
+        option = stb_models.Option.objects.create(mark='old_mark', product=product)
+        self.assertIn(option, stb_models.Option.objects.search('old_mark'))
+
+        option.mark = 'new_mark'
+        option.save()
+        self.assertNotIn(option, stb_models.Option.objects.search('old_mark'))
+        self.assertIn(option, stb_models.Option.objects.search('new_mark'))
+
+        product.name = 'another_name'
+        product.save()
+        self.assertIn(option, stb_models.Option.objects.search('another_name'))
+
+    def test_keep_search_document_on_price_change(self):
+        option = stb_models.Option.objects.create(
+            mark='some_mark',
+            product=stb_models.Product.objects.create(
+                name='some_name',
+                category=stb_models.Category.objects.create(name='some_name'),
+                page=pages_models.Page.objects.create(name='some_name', is_active=True),
+            ),
+        )
+        document_id = stb_models.OptionSearchDocument.objects.get(option=option).id
+        option.price += 1
+        option.save()
+        self.assertEqual(
+            document_id, stb_models.OptionSearchDocument.objects.get(option=option).id,
+        )
+
+    def test_catalog_names_follow_changes(self):
+        category = stb_models.Category.objects.create(name='some_category')
+        product = stb_models.Product.objects.create(
+            name='some_name',
+            category=category,
+            page=pages_models.Page.objects.create(name='some_name', is_active=True),
+        )
+        option = stb_models.Option.objects.create(mark='some_mark', product=product)
+        product.refresh_from_db()
+        self.assertEqual('some_name. some_category', product.catalog_name)
+
+        series = stb_models.Series.objects.create(name='some_series')
+        option.series = series
+        option.save()
+        product.refresh_from_db()
+        self.assertEqual('some_name. some_series', product.catalog_name)
+
+        product.name = 'another_name'
+        product.save()
+        option.refresh_from_db()
+        self.assertEqual('another_name some_mark', option.catalog_name)
+
+        series.name = 'another_series'
+        series.save()
+        product.refresh_from_db()
+        self.assertEqual('another_name. another_series', product.catalog_name)
+
+    def test_catalog_names_command(self):
+        product = stb_models.Product.objects.create(
+            name='some_name',
+            category=stb_models.Category.objects.create(name='some_category'),
+            page=pages_models.Page.objects.create(name='some_name', is_active=True),
+        )
+        option = stb_models.Option.objects.create(mark='some_mark', product=product)
+        stb_models.Option.objects.update(catalog_name='')
+        stb_models.Product.objects.update(catalog_name='')
+
+        call_command('catalog_names')
+        option.refresh_from_db()
+        product.refresh_from_db()
+        self.assertEqual('some_name some_mark', option.catalog_name)
+        self.assertEqual('some_name. some_category', product.catalog_name)
+
+    def test_options_table_names_without_queries(self):
+        """Options table should render the stored names without queries."""
+        product = stb_models.Product.objects.create(
+            name='some_name',
+            category=stb_models.Category.objects.create(name='some_category'),
+            page=pages_models.Page.objects.create(name='some_name', is_active=True),
+        )
+        stb_models.Option.objects.bulk_create(
+            stb_models.Option(mark=f'mark_{i}', product=product) for i in range(48)
+        )
+        stb_models.Option.update_catalog_names(product.options.all())
+        options = list(
+            stb_models.Option.objects.filter(product=product).bind_fields().order_by('id')
+        )
+
+        with self.assertNumQueries(0):
+            content = render_to_string(
+                'catalog/options.html', {'products': options, 'product_images': {}},
+            )
+        self.assertIn('some_name mark_0', content)
+        self.assertIn('some_name mark_47', content)
+
+
+@tag('fast')
+class Order(TestCase):
+
+    fixtures = ['dump.json']
+
+    def get_cart(self, size):
+        return [
+            (option.id, {
+                'name': option.name,
+                'price': option.price,
+                'quantity': 1,
+                'code': option.code or '',
+                'catalog_name': option.catalog_name,
+                'url': option.url,
+            })
+            for option in stb_models.Option.objects.bind_fields()[:size]
+        ]
+
+    def set_positions_queries(self, cart):
+        order = stb_models.Order()
+        with CaptureQueriesContext(connection) as queries:
+            order.set_positions(cart)
+        self.assertEqual(len(cart), order.positions.count())
+        return len(queries)
+
+    def test_set_positions_queries_count(self):
+        """Order positions count shouldn't affect queries count."""
+        self.assertEqual(
+            self.set_positions_queries(self.get_cart(1)),
+            self.set_positions_queries(self.get_cart(10)),
+        )
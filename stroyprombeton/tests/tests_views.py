@@ -6,24 +6,35 @@ They all should be using Django's TestClient.
 
 All Selenium-tests should be located in tests_selenium.
 """
+import gzip
 import json
+import os
+import shutil
+import tempfile
 import unittest
 from copy import copy
 from itertools import chain
 from operator import attrgetter
+from unittest import mock
 
 from bs4 import BeautifulSoup
 from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
 from django.db.models import Count
 from django.http import HttpResponse, QueryDict
 from django.test import override_settings, TestCase, tag
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.translation import ugettext as _
 
 from catalog.helpers import reverse_catalog_url
 from pages.models import CustomPage, FlatPage, ModelPage
-from stroyprombeton import context, models, request_data
+from pages.templatetags.pages_extras import breadcrumbs as get_page_breadcrumbs
+from stroyprombeton import devices, mailer, models, pdf, request_data, siblings, versions
 from stroyprombeton.templatetags import stb_extras
+from stroyprombeton.views import catalog as catalog_views
 from stroyprombeton.tests.helpers import CategoryTestMixin
 from stroyprombeton.tests.tests_forms import PriceFormTest
 
@@ -31,6 +42,8 @@ CANONICAL_HTML_TAG = '<link rel="canonical" href="{base_url}{path}">'
 CATEGORY_ROOT_NAME = 'Category root #0'
 PRODUCT_WITH_IMAGE = 110
 OPTION_WITH_IMAGE = 220
+# category page includes several menus, filters and the options table
+CATEGORY_QUERIES_BUDGET = 40
 
 
 def json_to_dict(response: HttpResponse) -> dict():
@@ -177,6 +190,31 @@ class Category(BaseCatalogTestCase, TestPageMixin):
         self.assertTrue(db_options[15] in response_products)
         self.assertTrue(db_options[25] not in response_products)
 
+    def test_fetch_products_by_cursor(self):
+        """Options fetched by the cursor should continue the previous fetched ones."""
+        def fetch(**data):
+            return self.client.post(
+                reverse('fetch_products'),
+                data={'categoryId': self.root_category.id, 'limit': 10, **data},
+            )
+
+        first = fetch(offset=0)
+        by_offset = fetch(offset=10)
+        by_cursor = fetch(cursor=first['X-Next-Cursor'])
+        self.assertEqual(200, by_cursor.status_code)
+        self.assertEqual(
+            list(by_offset.context['products']),
+            list(by_cursor.context['products']),
+        )
+        self.assertEqual(by_offset['X-Next-Cursor'], by_cursor['X-Next-Cursor'])
+
+    def test_fetch_products_broken_cursor(self):
+        response = self.client.post(
+            reverse('fetch_products'),
+            data={'categoryId': self.root_category.id, 'cursor': 'broken'},
+        )
+        self.assertEqual(400, response.status_code)
+
     def test_fetch_products_bad_request_processing(self):
         response = self.client.post(reverse('fetch_products'), data={})
         self.assertEqual(400, response.status_code)
@@ -184,10 +222,11 @@ class Category(BaseCatalogTestCase, TestPageMixin):
     def test_fetch_positions_searching(self):
         term = '#1'
         category = models.Category.objects.get(name='Category #0 of #1')
-        options = models.Option.objects.filter_descendants(category)
-        searched = context.options.search(  # Ignore CPDBear
-            term, options, context.options.Searched.LOOKUPS,
-            ordering=('product__name', )
+        searched = (
+            models.Option.objects
+            .active()
+            .filter_descendants(category)
+            .search(term)
         )
 
         response = self.client.post(
@@ -220,6 +259,16 @@ class Category(BaseCatalogTestCase, TestPageMixin):
             request_data.Category.PRODUCTS_ON_PAGE_PC
         )
 
+    def test_products_are_paginated_for_mobile(self):
+        category = models.Category.objects.first()
+        response = self.client.get(
+            self.get_category_url(category), HTTP_USER_AGENT=Devices.MOBILE_AGENT,
+        )
+        self.assertEqual(
+            len(response.context['products']),
+            request_data.Category.PRODUCTS_ON_PAGE_MOB
+        )
+
     def test_total_products(self):
         category = models.Category.objects.first()
         options = models.Option.objects.filter_descendants(category)
@@ -326,6 +375,18 @@ class Category(BaseCatalogTestCase, TestPageMixin):
             [s.text.strip() for s in sections_app]
         )
 
+    def test_queries_budget(self):
+        """Category page should fit the queries budget for any page size."""
+        def queries_count(step: int) -> int:
+            with CaptureQueriesContext(connection) as queries:
+                self.get_category_page(self.root_category, query_string={'step': step})
+            return len(queries)
+
+        steps = settings.CATEGORY_STEP_MULTIPLIERS
+        small, big = (queries_count(step) for step in [steps[0], steps[-1]])
+        self.assertEqual(small, big)
+        self.assertLessEqual(big, CATEGORY_QUERIES_BUDGET)
+
     def test_empty_products_404(self):
         """Category with no products should return 404 response."""
         category = models.Category.objects.get(name='Category root empty #17')
@@ -429,6 +490,8 @@ class Product_(TestCase, TestPageMixin):
 
     def setUp(self):
         """Create category and product."""
+        # siblings are cached
+        cache.clear()
         category_data = {
             'name': 'Test root category',
             'page': ModelPage.objects.create(h1='Category', content='Test category')
@@ -486,6 +549,25 @@ class Product_(TestCase, TestPageMixin):
         for tag_, parsed in zip(tags, parsed_tags):
             self.assertEqual(tag_.name, parsed.string.strip())
 
+    def test_tags_table_queries_count(self):
+        """Options tags table should take the same queries count for any options count."""
+        def queries_count(product: models.Product) -> int:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(product.url)
+            return len(queries)
+
+        product = models.Product.objects.filter(options__tags__isnull=False).first()
+        tags = list(models.Tag.objects.filter(group__isnull=False))
+        for option in product.options.all():
+            option.tags.add(*tags)
+        before = queries_count(product)
+
+        for i in range(10):
+            models.Option.objects.create(
+                mark=f'Extra tagged mark #{i}', product=product,
+            ).tags.add(*tags)
+        self.assertEqual(before, queries_count(product))
+
     def test_series_label(self):
         series = models.Series.objects.first()
         product = series.options.first().product
@@ -495,6 +577,47 @@ class Product_(TestCase, TestPageMixin):
         self.assertEqual(series.name, link.text.strip())
         self.assertEqual(series.url, link['href'])
 
+    def get_series_product(self) -> models.Product:
+        return models.Option.objects.active().filter(series__isnull=False).first().product
+
+    def test_siblings(self):
+        """Siblings should be distinct active products of the series ordered by name."""
+        product = self.get_series_product()
+        response = self.client.get(product.url)
+        siblings_ = [sibling for sibling, image in response.context['sibling_with_images']]
+
+        self.assertEqual(len(siblings_), len(set(siblings_)))
+        self.assertEqual(sorted(siblings_, key=lambda p: p.name), siblings_)
+        self.assertLessEqual(len(siblings_), settings.PRODUCT_SIBLINGS_COUNT)
+        self.assertIn(product, siblings_)
+
+    def test_siblings_queries_count(self):
+        product = (
+            models.Product.objects
+            .select_related('page')
+            .prefetch_related('options')
+            .get(id=self.get_series_product().id)
+        )
+        with self.assertNumQueries(2):
+            siblings.fetch(siblings.get_series_ids(product), settings.PRODUCT_SIBLINGS_COUNT)
+        siblings.get(product)
+        with self.assertNumQueries(0):
+            siblings.get(product)
+
+    def test_inactive_product_series(self):
+        """Inactive product has no active options, so it has no siblings series."""
+        product = self.get_series_product()
+        product.page.is_active = False
+        product.page.save()
+        self.assertEqual([], siblings.get_series_ids(product))
+
+    def test_siblings_cache_invalidation(self):
+        product = self.get_series_product()
+        siblings.get(product)
+        product.name = 'AAA renamed sibling'
+        product.save()
+        self.assertEqual(product.name, siblings.get(product)[0][0].name)
+
 
 class AbstractFormViewTest:
     """
@@ -554,6 +677,75 @@ class OrderPrice(AbstractFormViewTest, TestCase):
         super(OrderPrice, self).setUp()
 
 
+@tag('fast')
+class MailDispatch(TestCase):
+
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.settings = override_settings(MAIL_SPOOL_DIR=self.spool_dir)
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.spool_dir)
+
+    def order_backcall(self):
+        return self.client.post(reverse('order_backcall'), {
+            'orderData[id_name]': 'Yo',
+            'orderData[id_phone]': '+2 (222) 222 22 22',
+            'orderData[url]': '/',
+        })
+
+    def test_send_without_celery(self):
+        self.order_backcall()
+        self.assertEqual(1, len(mail.outbox))
+        self.assertIn('name: Yo', mail.outbox[0].body)
+        self.assertEqual(settings.EMAIL_SUBJECTS['backcall'], mail.outbox[0].subject)
+
+    @override_settings(USE_CELERY=True)
+    def test_queue_to_celery(self):
+        """Form view should queue the email instead of sending it."""
+        with mock.patch('stroyprombeton.tasks.send_mail.delay') as delay:
+            response = self.order_backcall()
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(0, len(mail.outbox))
+        message, = delay.call_args[0]
+        self.assertIn('name: Yo', message['html'])
+
+    @override_settings(USE_CELERY=True)
+    def test_spool_without_broker(self):
+        with mock.patch(
+            'stroyprombeton.tasks.send_mail.delay', side_effect=ConnectionError,
+        ):
+            self.assertEqual(200, self.order_backcall().status_code)
+            self.order_backcall()
+        self.assertEqual(0, len(mail.outbox))
+        self.assertEqual(2, len(os.listdir(self.spool_dir)))
+
+        self.assertEqual(2, mailer.flush_spool())
+        self.assertEqual(2, len(mail.outbox))
+        self.assertFalse(os.listdir(self.spool_dir))
+
+    def test_flush_spool_by_batches(self):
+        mailer.spool([mailer.build(subject='Test', html='<p>test</p>')] * 3)
+        with mock.patch.object(mailer, 'BATCH_SIZE', 2):
+            with mock.patch.object(
+                mailer, 'get_connection', wraps=mailer.get_connection,
+            ) as get_connection:
+                self.assertEqual(3, mailer.flush_spool())
+        self.assertEqual(2, get_connection.call_count)
+        self.assertEqual(3, len(mail.outbox))
+
+    def test_flush_spool_keeps_failed(self):
+        """Only the failed message should stay at the spool."""
+        mailer.spool([mailer.build(subject='Test', html='<p>test</p>')] * 3)
+        with mock.patch.object(
+            mailer.EmailMultiAlternatives, 'send', side_effect=[1, ConnectionError, 1],
+        ):
+            self.assertEqual(2, mailer.flush_spool())
+        self.assertEqual(1, len(os.listdir(self.spool_dir)))
+
+
 @tag('fast')
 class IndexPage(TestCase):
 
@@ -574,6 +766,178 @@ class IndexPage(TestCase):
         self.assertContains(response, region.url)
 
 
+@tag('fast')
+class Devices(TestCase):
+
+    MOBILE_AGENT = (
+        'Mozilla/5.0 (iPhone; CPU iPhone OS 12_3_1 like Mac OS X) AppleWebKit/605.1.15'
+        ' (KHTML, like Gecko) Version/12.1.1 Mobile/15E148 Safari/604.1'
+    )
+    AGENTS = {
+        MOBILE_AGENT: devices.Device.MOBILE,
+        'Mozilla/5.0 (iPad; CPU OS 12_3_1 like Mac OS X) AppleWebKit/605.1.15'
+        ' (KHTML, like Gecko) Version/12.1.1 Mobile/15E148 Safari/604.1': devices.Device.TABLET,
+        'Mozilla/5.0 (compatible; YandexBot/3.0; +http://yandex.com/bots)': devices.Device.BOT,
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        ' (KHTML, like Gecko) Chrome/75.0.3770.142 Safari/537.36': devices.Device.DESKTOP,
+        '': devices.Device.DESKTOP,
+    }
+
+    def test_classify(self):
+        for agent, device in self.AGENTS.items():
+            self.assertEqual(device, devices.classify(agent), agent)
+
+    def test_classification_cache(self):
+        devices.classify.cache_clear()
+        for i in range(3):
+            devices.classify(self.MOBILE_AGENT)
+        self.assertEqual(2, devices.classify.cache_info().hits)
+
+    def test_request_device(self):
+        response = self.client.get('/', HTTP_USER_AGENT=self.MOBILE_AGENT)
+        self.assertEqual(devices.Device.MOBILE, response.wsgi_request.device)
+        self.assertEqual(devices.Device.MOBILE, response.context['device'])
+
+
+@tag('fast')
+class NavigationMenu(TestCase):
+
+    fixtures = ['dump.json']
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('pages:flat_page', args=('contacts',))
+
+    def test_cached_menu(self):
+        """Menu shouldn't query catalog entities for the cached version."""
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'stroyprombeton_series' in query['sql']
+            or 'stroyprombeton_section' in query['sql']
+        ])
+
+    def test_menu_follows_changes(self):
+        self.client.get(self.url)
+        series = stb_extras.get_top_menu_series().first()
+        series.name = 'Some new name'
+        series.save()
+        self.assertContains(self.client.get(self.url), 'Some new name')
+
+    def test_keep_menu_on_option_price_change(self):
+        """Options prices aren't shown in the menu."""
+        version = versions.get(versions.MENU)
+        option = models.Option.objects.first()
+        option.price += 1
+        option.save()
+        self.assertEqual(version, versions.get(versions.MENU))
+
+    def test_menu_follows_option_series(self):
+        """Series are shown in the menu only with options."""
+        version = versions.get(versions.MENU)
+        option = models.Option.objects.filter(series__isnull=False).first()
+        option.series = None
+        option.save()
+        self.assertNotEqual(version, versions.get(versions.MENU))
+
+    def test_menu_follows_product_page_activity(self):
+        version = versions.get(versions.MENU)
+        page = models.Product.objects.filter(page__is_active=True).first().page
+        page.is_active = False
+        page.save()
+        self.assertNotEqual(version, versions.get(versions.MENU))
+
+    def test_menu_follows_page_activity(self):
+        version = versions.get(versions.MENU)
+        page = stb_extras.get_top_menu_categories().first().page
+        page.is_active = False
+        page.save()
+        self.assertNotEqual(version, versions.get(versions.MENU))
+
+
+@tag('fast')
+class CategoriesExport(TestCase):
+
+    fixtures = ['dump.json']
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('categories-export')
+
+    def get_rows(self, response) -> list:
+        content = b''.join(response.streaming_content).decode()
+        return [row.split('|') for row in content.splitlines()]
+
+    def test_breadcrumbs(self):
+        """Export should contain crumbs of every active category."""
+        rows = self.get_rows(self.client.get(self.url))
+        self.assertEqual(models.Category.objects.active().count(), len(rows))
+
+        category = models.Category.objects.active().filter(level=2).first()
+        crumbs = get_page_breadcrumbs(category.page)['crumbs_list']
+        self.assertIn(
+            ' » '.join(name for name, url in crumbs),
+            {crumbs for url, name, crumbs in rows},
+        )
+
+    def test_crumbs_pages(self):
+        """Export should load only category pages and their ancestors."""
+        category_pages = models.CategoryPage.objects.all()
+        pages = catalog_views.load_with_ancestors(category_pages)
+        self.assertEqual(
+            {
+                ancestor.id
+                for page in category_pages
+                for ancestor in page.get_ancestors(include_self=True)
+            },
+            set(pages),
+        )
+
+    def test_gzip(self):
+        gzipped = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual('gzip', gzipped['Content-Encoding'])
+        self.assertEqual(
+            b''.join(self.client.get(self.url).streaming_content),
+            gzip.decompress(gzipped.content),
+        )
+
+
+@tag('fast')
+class Matrix(TestCase):
+
+    fixtures = ['dump.json']
+
+    def setUp(self):
+        cache.clear()
+
+    def test_series_matrix(self):
+        """Series matrix should contain only non empty series."""
+        response = self.client.get(reverse('custom_page', args=('series',)))
+        for series in models.Series.objects.exclude_empty():
+            self.assertContains(response, series.url)
+
+    def test_cached_matrix(self):
+        """Matrix page shouldn't query sections for the cached version."""
+        url = reverse('custom_page', args=('sections',))
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'stroyprombeton_section' in query['sql']
+        ])
+
+    def test_matrix_follows_changes(self):
+        url = reverse('custom_page', args=('sections',))
+        self.client.get(url)
+        section = models.Section.objects.exclude_empty().first()
+        section.name = 'Some new name'
+        section.save()
+        self.assertContains(self.client.get(url), 'Some new name')
+
+
 @tag('fast')
 class RobotsPage(TestCase):
 
@@ -665,12 +1029,29 @@ class Search(TestCase):
         self.assertContains(response, '<title>')
         self.assertContains(response, '<td class="table-td table-name">')
 
+    def test_option_results(self):
+        """Search page should contain options found by mark."""
+        option = models.Option.objects.active().exclude(mark='').first()
+        response = self.search(term=option.mark)
+        self.assertIn(option, response.context['items'])
+
     def test_no_results(self):
         """Search page should not contain results for wrong term."""
         response = self.search(term=self.WRONG_TERM)
         self.assertEqual(response.status_code, 200)
         self.assertNotContains(response, '<div class="search-result-item">')
 
+    def test_tag_deletion(self):
+        """Options shouldn't be found by a deleted tag."""
+        option = models.Option.objects.active().filter(tags__isnull=False).first()
+        option_tag = option.tags.first()
+        option_tag.name = 'some_tag_name'
+        option_tag.save()
+        self.assertIn(option, models.Option.objects.search('some_tag_name'))
+
+        option_tag.delete()
+        self.assertNotIn(option, models.Option.objects.search('some_tag_name'))
+
 
 @tag('fast')
 class Autocomplete(TestCase):
@@ -679,6 +1060,30 @@ class Autocomplete(TestCase):
     TERM = 'Prod'
     WRONG_TERM = 'Bugaga'  # it's short for trigram search testing
 
+    def setUp(self):
+        # workers' autocomplete index should forget data from the previous tests
+        cache.clear()
+
+    def test_autocomplete_without_queries(self):
+        """Autocomplete should work with the in-memory index only."""
+        url = reverse('autocomplete') + f'?term={self.TERM}'
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, self.TERM)
+
+    def test_index_follows_indexed_fields(self):
+        """Only indexed fields changes should rebuild the index."""
+        version = versions.get(versions.AUTOCOMPLETE)
+        option = models.Option.objects.first()
+        option.price += 1
+        option.save()
+        self.assertEqual(version, versions.get(versions.AUTOCOMPLETE))
+
+        option.mark = 'new_mark'
+        option.save()
+        self.assertNotEqual(version, versions.get(versions.AUTOCOMPLETE))
+
     def test_autocomplete_has_results(self):
         """Autocomplete should contain at least one result for right term."""
         term = self.TERM
@@ -740,15 +1145,63 @@ class ProductPrice(TestCase):
     fixtures = ['dump.json']
 
     def setUp(self):
+        # price list file depends on the category version from the cache
+        cache.clear()
         self.category = models.CategoryPage.objects.filter(level=0).first()
         self.response = self.client.get(
             reverse('product_pdf', args=(self.category.id,))
         )
         self.context = self.response.context
 
+    def tearDown(self):
+        pdf.remove(models.Category.objects.get(id=self.category.id))
+
     def test_content_type(self):
         self.assertEqual(self.response['Content-Type'], 'application/pdf')
 
+    def test_cached_file(self):
+        """Price list should be served from the file cache."""
+        response = self.client.get(reverse('product_pdf', args=(self.category.id,)))
+        self.assertIsNone(response.context)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    @override_settings(USE_CELERY=True)
+    def test_background_rendering(self):
+        """Changed price list should be rendered by a task."""
+        category = models.Category.objects.get(id=self.category.id)
+        option = models.Option.objects.filter_descendants(category).first()
+        option.price += 1
+        option.save()
+
+        with mock.patch('stroyprombeton.tasks.render_pdf_price.delay') as delay:
+            response = self.client.get(reverse('product_pdf', args=(self.category.id,)))
+        self.assertEqual(202, response.status_code)
+        delay.assert_called_once_with(category.id, pdf.get_path(category))
+
+    @override_settings(USE_CELERY=True)
+    def test_keep_failed_rendering(self):
+        """Polls shouldn't restart a failed rendering."""
+        category = models.Category.objects.get(id=self.category.id)
+        pdf.remove(category)
+        pdf.fail_rendering(pdf.get_path(category))
+
+        with mock.patch('stroyprombeton.tasks.render_pdf_price.delay') as delay:
+            response = self.client.get(reverse('product_pdf', args=(self.category.id,)))
+        self.assertEqual(503, response.status_code)
+        delay.assert_not_called()
+
+    def test_outdated_file_removed(self):
+        """Rendering of a changed price list should remove the outdated file."""
+        category = models.Category.objects.get(id=self.category.id)
+        outdated_path = pdf.get_path(category)
+        option = models.Option.objects.filter_descendants(category).first()
+        option.price += 1
+        option.save()
+
+        self.client.get(reverse('product_pdf', args=(self.category.id,)))
+        self.assertFalse(os.path.exists(outdated_path))
+        self.assertTrue(os.path.exists(pdf.get_path(category)))
+
     def test_category_name(self):
         self.assertEqual(self.context['category'].name, self.category.name)
 
@@ -794,6 +1247,23 @@ class CatalogTags(BaseCatalogTestCase, CategoryTestMixin):
         for tag_name in tag_names:
             self.assertContains(response, tag_name)
 
+    def test_tags_counts(self):
+        """Tags filter should show options count for every tag."""
+        response = self.client.get(self.get_category_path())
+        # groups with too many tags show the tags range instead
+        tag_, *others = next(
+            tags for group, tags in response.context['group_tags_pairs']
+            if len(tags) < settings.TAGS_UI_LIMIT
+        )
+        options = (
+            models.Option.objects.active()
+            .filter_descendants(self.category)
+            .filter(tags=tag_)
+        )
+        self.assertContains(
+            response, f'<span class="tags-filter-count">{options.count()}</span>',
+        )
+
     def test_has_canonical_meta_tag(self):
         """Test that CategoryPage should contain canonical meta tag."""
         response = self.client.get(self.get_category_path())
@@ -1,12 +1,10 @@
 from django.conf import settings
 from django.conf.urls import url, include
 from django.conf.urls.static import static
-from django.contrib.sitemaps import views as sitemaps_view
-from django.views.decorators.cache import cache_page
 
 from pages.urls import custom_page_url
 from pages.views import RobotsView, SitemapPage
-from stroyprombeton import sitemaps, views
+from stroyprombeton import views
 from stroyprombeton.admin import admin_site
 
 admin_urls = [
@@ -72,16 +70,6 @@ search_urls = [
     url(r'^autocomplete/$', views.Autocomplete.as_view(), name='autocomplete'),
 ]
 
-sitemaps = {
-    'categories': sitemaps.CategoryPagesSitemap,
-    'custom-pages': sitemaps.CustomPagesSitemap,
-    'index': sitemaps.IndexSitemap,
-    'flat-pages': sitemaps.FlatPagesSitemap,
-    'products': sitemaps.ProductPagesSitemap,
-}
-
-cached_view = cache_page(settings.CACHED_TIME)
-
 urlpatterns = [
     url(r'', include(custom_pages)),
     url(r'admin/', include(admin_urls)),
@@ -91,10 +79,9 @@ urlpatterns = [
     url(r'^price-success/', views.OrderPriceSuccess.as_view(), name='order_price_success'),
     url(r'^search/', include(search_urls)),
     url(r'^shop/', include(ecommerce_urls)),
-    url(r'^sitemap\.xml$', cached_view(sitemaps_view.index),
-        {'sitemaps': sitemaps, 'sitemap_url_name': 'sitemaps_children'}, name='sitemap'),
-    url(r'^sitemap-(?P<section>.+)\.xml$', cached_view(sitemaps_view.sitemap),
-        {'sitemaps': sitemaps}, name='sitemaps_children'),
+    # nginx serves the sitemaps files. This views are for the other environments
+    url(r'^(?P<file_name>sitemap\.xml)$', views.sitemap, name='sitemap'),
+    url(r'^(?P<file_name>sitemap-[^/]+\.xml)$', views.sitemap, name='sitemaps_children'),
 ]
 
 if settings.DEBUG:
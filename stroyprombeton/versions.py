@@ -0,0 +1,57 @@
+"""
+Versions of cached data.
+
+Cached data keys contain a version.
+Signals at `stroyprombeton.signals` bump the version on the data changes,
+so the outdated data is never read again and expires by the cache timeout.
+"""
+
+import typing
+from uuid import uuid4
+
+from django.core.cache import cache
+
+MENU = 'menu'
+MATRIX = 'matrix'
+PAGES = 'pages'
+OPTIONS = 'options'
+AUTOCOMPLETE = 'autocomplete'
+# category version is bumped on changes of it's subtree options
+CATEGORY = 'category'
+# series version is bumped on changes of it's products
+SERIES = 'series'
+
+
+def get_key(name: str) -> str:
+    return f'version:{name}'
+
+
+def get(name: str) -> str:
+    version = cache.get(get_key(name))
+    if version is None:
+        version = bump(name)
+    return version
+
+
+def bump(name: str) -> str:
+    version = uuid4().hex
+    cache.set(get_key(name), version, None)
+    return version
+
+
+def get_category(category_id: int) -> str:
+    return get(f'{CATEGORY}:{category_id}')
+
+
+def bump_categories(category_ids: typing.Iterable[int]):
+    for id_ in set(category_ids):
+        bump(f'{CATEGORY}:{id_}')
+
+
+def get_series(series_id: int) -> str:
+    return get(f'{SERIES}:{series_id}')
+
+
+def bump_series(series_ids: typing.Iterable[int]):
+    for id_ in set(series_ids):
+        bump(f'{SERIES}:{id_}')
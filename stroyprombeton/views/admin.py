@@ -1,10 +1,11 @@
-from django.db.models import ObjectDoesNotExist, Value
-from django.db.models.functions import Concat
-from django.http import HttpResponse
+from django.db.models import ObjectDoesNotExist
+from django.http import StreamingHttpResponse
+from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
+from django.views.decorators.http import condition
 
 from generic_admin import views as admin_views
-from stroyprombeton import models, forms
+from stroyprombeton import models, forms, versions
 
 
 def category_name_strategy(entity, related_model_entity, related_model_value):
@@ -85,16 +86,36 @@ class RedirectToProduct(admin_views.RedirectToProductPage):
     site_page_product_urlconf = 'product'
 
 
+# `reverse()` is too slow for every option, so urls are formatted from a template
+PRODUCT_URL_ID = 987654321
+
+
+def get_product_url_template() -> str:
+    return reverse('product', args=(PRODUCT_URL_ID,)).replace(str(PRODUCT_URL_ID), '{id}')
+
+
+def get_options_etag(request) -> str:
+    """
+    Return the options version as the ETag.
+
+    Signals bump the version on options, products and pages changes.
+    The version lives at the Redis cache, so all web workers return the same ETag.
+    """
+    return versions.get(versions.OPTIONS)
+
+
+@condition(etag_func=get_options_etag)
 def csv_options(request):
-    # hard code url because it's template
+    url_template = get_product_url_template()
     options = (
         models.Option.objects
-        .bind_fields()
         .active()
-        .annotate(label=Concat('product__name', Value(' '), 'mark'))
+        .values_list('product_id', 'product__name', 'mark')
     )
-    csv = '\n'.join([f'{o.url};{o.label}' for o in options])
-    return HttpResponse(
+    return StreamingHttpResponse(
+        (
+            f'{url_template.format(id=product_id)};{name} {mark}\n'
+            for product_id, name, mark in options.iterator()
+        ),
         content_type='text/csv',
-        content=csv.encode()
     )
@@ -1,37 +1,44 @@
+import os
 import typing
-from collections import defaultdict
+import zlib
 from csv import writer as CSVWriter
-from operator import attrgetter
 
 from django import http
 from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import get_object_or_404, render
 from django.views.generic.detail import DetailView
 from django.views.generic.list import ListView
-from wkhtmltopdf.views import PDFTemplateView
 
 from catalog import context
 from catalog.views import catalog
 from images.models import Image
-from pages import context as pages_context
 from pages import models as pages_models
-from pages.templatetags.pages_extras import breadcrumbs as get_page_breadcrumbs
-from stroyprombeton import context as stb_context, models, exception, request_data
+from stroyprombeton import (
+    context as stb_context, models, exception, matrix, pdf, request_data, siblings, tasks,
+    versions,
+)
 from stroyprombeton.views.helpers import set_csrf_cookie
 
+# pages version invalidates the file, so the timeout only cleans the cache
+CATEGORIES_CSV_CACHE_TIMEOUT = 24 * 60 * 60
+
 
 def fetch_products(request):
     """Filter product table on Category page by Name, code, specification."""
     try:
         context_ = stb_context.FetchOptions(
             request_data.FetchProducts(request, url_kwargs={}),
-        )
+        ).context()
     # @todo #451:60m  Create middleware to for http errors. se2
     #  Middleware should transform http exceptions to http errors errors.
     except exception.Http400 as e:
         return http.HttpResponseBadRequest(str(e))
 
-    return render(request, 'catalog/options.html', context_.context())
+    response = render(request, 'catalog/options.html', context_)
+    # client sends it back to fetch the next options
+    response['X-Next-Cursor'] = context_['next_cursor']
+    return response
 
 
 class CSVExportBuffer:
@@ -41,32 +48,93 @@ class CSVExportBuffer:
         return value
 
 
-def categories_csv_export(request, filename='categories.csv', breadcrumbs_delimiter=' » '):
-
-    def serialize_categories(categories):
-        for category in categories:
-            url = settings.BASE_URL + category.get_absolute_url()
-            breadcrumbs = get_page_breadcrumbs(category)['crumbs_list']
-            breadcrumbs = breadcrumbs_delimiter.join(
-                (name for name, url in breadcrumbs)
-            )
-
-            yield (
-                url, category.name, breadcrumbs
-            )
-
-    buf = CSVExportBuffer()
-    writer = CSVWriter(buf, delimiter='|')
-
-    categories = serialize_categories(
-        models.CategoryPage.objects.active()
+# page fields to render crumbs
+CRUMBS_PAGE_FIELDS = ['id', 'parent', 'name', 'menu_title']
+
+
+def load_with_ancestors(
+    pages: typing.Iterable[pages_models.Page]
+) -> typing.Dict[int, pages_models.Page]:
+    """Map ids to the given pages and their ancestors. Query every missed tree level."""
+    loaded = {page.id: page for page in pages}
+    missed = {page.parent_id for page in loaded.values()} - loaded.keys() - {None}
+    while missed:
+        parents = list(pages_models.Page.objects.filter(id__in=missed).only(*CRUMBS_PAGE_FIELDS))
+        loaded.update((page.id, page) for page in parents)
+        missed = {page.parent_id for page in parents} - loaded.keys() - {None}
+    return loaded
+
+
+def get_pages_crumbs(
+    pages: typing.Dict[int, pages_models.Page]
+) -> typing.Dict[int, typing.List[str]]:
+    """Map page ids to their ancestors names. Pages should contain all their ancestors."""
+    crumbs = {}
+
+    def get_crumbs(page_id: int) -> typing.List[str]:
+        if page_id not in crumbs:
+            parent_id = pages[page_id].parent_id
+            crumbs[page_id] = [] if parent_id is None else [
+                *get_crumbs(parent_id), pages[parent_id].display_menu_title,
+            ]
+        return crumbs[page_id]
+
+    for id_ in pages:
+        get_crumbs(id_)
+    return crumbs
+
+
+def serialize_categories(breadcrumbs_delimiter: str) -> typing.Iterator[str]:
+    """Serialize active categories to csv lines by a few queries."""
+    crumbs = get_pages_crumbs(load_with_ancestors(
+        pages_models.Page.objects
+        .filter(stroyprombeton_category__isnull=False)
+        .only(*CRUMBS_PAGE_FIELDS)
+    ))
+    writer = CSVWriter(CSVExportBuffer(), delimiter='|')
+    categories = (
+        models.Category.objects
+        .active()
+        .select_related('page')
+        .order_by('page__tree_id', 'page__lft')
     )
+    for category in categories.iterator():
+        yield writer.writerow((
+            settings.BASE_URL + category.get_absolute_url(),
+            category.page.name,
+            breadcrumbs_delimiter.join(crumbs[category.page.id]),
+        ))
+
+
+def get_categories_csv_gzip(breadcrumbs_delimiter: str) -> bytes:
+    """Gzipped categories csv. It's cached until pages change."""
+    key = f'categories_csv:{breadcrumbs_delimiter}:{versions.get(versions.PAGES)}'
+    content = cache.get(key)
+    if content is None:
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)  # gzip container
+        rows = serialize_categories(breadcrumbs_delimiter)
+        content = b''.join([
+            *(compressor.compress(row.encode()) for row in rows),
+            compressor.flush(),
+        ])
+        cache.set(key, content, CATEGORIES_CSV_CACHE_TIMEOUT)
+    return content
 
-    response = http.StreamingHttpResponse(
-        (writer.writerow(c) for c in categories),
-        content_type="text/csv",
-    )
+
+def categories_csv_export(request, filename='categories.csv', breadcrumbs_delimiter=' » '):
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = http.HttpResponse(
+            get_categories_csv_gzip(breadcrumbs_delimiter),
+            content_type='text/csv',
+        )
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = http.StreamingHttpResponse(
+            serialize_categories(breadcrumbs_delimiter),
+            content_type='text/csv',
+        )
     response['Content-Disposition'] = 'attachment; filename="{0}"'.format(filename)
+    response['Vary'] = 'Accept-Encoding'
 
     return response
 
@@ -119,6 +187,25 @@ class CategoryPage(catalog.CategoryPage):
         }
 
 
+def get_options_tags_matrix(
+    options: models.OptionQuerySet, tag_groups: typing.List[models.TagGroup],
+) -> typing.List[typing.Tuple[models.Option, typing.List[str]]]:
+    """
+    Map every option to its tag names ordered by the given tag groups.
+
+    Options should have prefetched tags.
+    An empty string stands for the group the option has no tags in.
+    """
+    def row(option):
+        # one tag per group is enough for the table cell
+        group_tag = {}
+        for tag_ in option.tags.all():
+            group_tag.setdefault(tag_.group_id, tag_.name)
+        return [group_tag.get(group.id, '') for group in tag_groups]
+
+    return [(option, row(option)) for option in options]
+
+
 @set_csrf_cookie
 class ProductPage(catalog.ProductPage):
     ANCESTORS_LABELS = ['Тип изделия', 'класс', 'вид']
@@ -135,29 +222,6 @@ class ProductPage(catalog.ProductPage):
         context = super(ProductPage, self).get_context_data(**kwargs)
         product = context[self.context_object_name]
 
-        siblings_count = settings.PRODUCT_SIBLINGS_COUNT
-        sibling_options = (
-            models.Option.objects
-            .filter(series__in=(
-                product.options.active()
-                .values_list('series__id', flat=True))
-            )
-        )
-        # @todo #656:60m  Create tests for product siblings.
-        siblings = sorted(
-            set([o.product for o in sibling_options][:siblings_count]),
-            key=attrgetter('name')
-        )
-
-        images = Image.objects.get_main_images_by_pages(
-            sibling.page for sibling in siblings
-        )
-
-        siblings_with_images = [
-            (product, images.get(product.page))
-            for product in siblings
-        ]
-
         offset = 1  # "каталог" page
         limit = 3
         ancestors_qs = (
@@ -170,106 +234,95 @@ class ProductPage(catalog.ProductPage):
             (label, category)
             for label, category in zip(self.ANCESTORS_LABELS, ancestors_qs)
         ]
-        tag_groups = (
+        tag_groups = list(
             models.Tag.objects
             .filter_by_options(product.options.all())
             .group_tags()
-        ).keys()
-        options = product.options.all().order_by(*settings.OPTIONS_ORDERING)
+        )
+        options = (
+            product.options.all()
+            .prefetch_related('tags')
+            .order_by(*settings.OPTIONS_ORDERING)
+        )
 
         return {
             **context,
-            'sibling_with_images': siblings_with_images,
+            'sibling_with_images': siblings.get(product),
             'ancestor_pairs': ancestor_pairs,
             'tag_groups': tag_groups,
             'options': options,
+            'options_tags': get_options_tags_matrix(options, tag_groups),
         }
 
 
-class ProductPDF(PDFTemplateView, DetailView):
+class ProductPDF(DetailView):
+    """
+    Category price list in PDF.
+
+    Celery renders it at background, see `stroyprombeton.pdf` for details.
+    The view returns the rendered file or the rendering page with 202 status.
+    The page reloads itself until the file is ready.
+    A failed rendering returns 503 status for a while instead of restarting.
+    """
+
     model = models.Category
-    context_object_name = 'category'
     pk_url_kwarg = 'category_id'
-    template_name = 'catalog/product_pdf_price.html'
+    rendering_template_name = 'catalog/product_pdf_rendering.html'
     filename = 'stb_product_price.pdf'
-
-    def get(self, *args, **kwargs):
-        self.object = self.get_object()
-        return super().get(*args, **kwargs)
-
-    def get_context_data(self, **kwargs):
-        context_ = super().get_context_data(**kwargs)
-        category = context_[self.context_object_name]
-
-        options_ = stb_context.options.CategoryFiltered(
-            stb_context.options.All(),
-            category
-        )
-        grouped_tags = context.tags.GroupedTags(
-            tags=stb_context.TagsByOptions(
-                stb_context.tags.All(),
-                options_.qs(),
-            )
+    retry_after = 5
+
+    def get(self, request, *args, **kwargs):
+        category = self.get_object()
+        path = pdf.get_path(category)
+        if not settings.USE_CELERY and not os.path.exists(path):
+            pdf.render(category, path)
+
+        try:
+            # the file could be removed by a newer price list rendering
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            return self.rendering_response(category, path)
+
+        response = http.FileResponse(file, content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}"'
+        return response
+
+    def rendering_response(self, category: models.Category, path: str):
+        if pdf.is_failed(path):
+            response = http.HttpResponse(status=503)
+            response['Retry-After'] = pdf.FAILURE_TIMEOUT
+            return response
+
+        if pdf.start_rendering(category):
+            tasks.render_pdf_price.delay(category.id, path)
+        response = render(
+            self.request,
+            self.rendering_template_name,
+            {'category': category, 'retry_after': self.retry_after},
+            status=202,
         )
-
-        return {
-            **context_,
-            **pages_context.Contexts([
-                options_, grouped_tags,
-            ]).context(),
-            'category': category,
-        }
+        response['Retry-After'] = self.retry_after
+        return response
 
 
 def series_matrix(request, page='series'):
-    def partition_(items: list, columns: int) -> typing.Collection[list]:
-        """Partition items to the columns by given columns count."""
-        result = defaultdict(list)
-        column_length = len(items) // columns + 1
-        for i, e in enumerate(items):
-            result[i // column_length].append(e)
-        return result.values()
-
-    columns = settings.SERIES_MATRIX_COLUMNS_COUNT
-    page = pages_models.CustomPage.objects.get(slug=page)
-    series = (
-        models.Series.objects.bind_fields()
-        .exclude_empty()
-        .order_by('name')
-    )
     return render(
         request,
         'catalog/matrix.html',
         {
-            'page': page,
-            'parted_items': partition_(series, columns),
+            'page': pages_models.CustomPage.objects.get(slug=page),
+            'parted_items': matrix.get('series'),
         }
     )
 
 
-# waiting for #631 to avoid code doubling between series and sections
 def sections_matrix(request, page='sections'):
-    def partition_(items: list, columns: int) -> typing.Collection[list]:
-        """Part items to the columns by given columns count."""
-        result = defaultdict(list)  # Ignore CPDBear
-        column_length = len(items) // columns + 1
-        for i, e in enumerate(items):
-            result[i // column_length].append(e)
-        return result.values()
-
-    columns = settings.SECTIONS_MATRIX_COLUMNS_COUNT
-    page = pages_models.CustomPage.objects.get(slug=page)
-    sections = (
-        models.Section.objects.bind_fields()
-        .exclude_empty()
-        .order_by('name')
-    )
     return render(
         request,
         'catalog/matrix.html',
         {
-            'page': page,
-            'parted_items': partition_(sections, columns),
+            'page': pages_models.CustomPage.objects.get(slug=page),
+            'parted_items': matrix.get('sections'),
         }
     )
 
@@ -1,3 +1,5 @@
+import typing
+
 from django.conf import settings
 from django.core.urlresolvers import reverse_lazy
 from django.http import HttpResponse
@@ -6,7 +8,6 @@ from django.views.decorators.http import require_POST
 from django.views.generic import FormView, TemplateView
 
 from ecommerce import cart as ec_cart, views as ec_views
-from ecommerce.mailer import send_backcall
 from pages.models import CustomPage
 from pages.views import CustomPageView
 from stroyprombeton import mailer
@@ -15,7 +16,21 @@ from stroyprombeton.models import Option, Order
 
 
 class Cart(ec_cart.Cart):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # options of the cart positions with their related data
+        self.options: typing.Dict[int, Option] = {}
+
     def get_position_data(self, position: Option):
+        if position.id not in self.options:
+            # fetch the related data of all the cart positions by one query
+            self.options = (
+                Option.objects
+                .select_related('product__page')
+                .in_bulk([position.id, *(id_ for id_, data in self)])
+            )
+        position = self.options[position.id]
         return {
             **super().get_position_data(position),
             'code': position.code or '',
@@ -118,7 +133,7 @@ def order_backcall(request):
         'orderData[url]'
     )
 
-    send_backcall(
+    mailer.send_backcall(
         subject=settings.EMAIL_SUBJECTS['backcall'],
         name=name,
         phone=phone,
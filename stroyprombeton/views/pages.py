@@ -1,11 +1,14 @@
+import os
 from itertools import groupby
 
-from django_user_agents.utils import get_user_agent
+from django.conf import settings
+from django.http import FileResponse, Http404
 from mptt.utils import get_cached_trees
 
 import pages.views
 from ecommerce.forms import OrderBackcallForm
 from pages.models import FlatPage, CustomPage
+from stroyprombeton import devices, sitemaps
 
 
 def get_cached_regions():
@@ -28,7 +31,7 @@ class IndexPage(pages.views.CustomPageView):
 
     def get_context_data(self, **kwargs):
         context = super(IndexPage, self).get_context_data(**kwargs)
-        mobile_view = get_user_agent(self.request).is_mobile
+        mobile_view = devices.get(self.request).is_mobile
 
         def prepare_pages(parent_slug, pages_):
             if parent_slug == 'news':
@@ -90,3 +93,13 @@ class RegionsPageView(pages.views.CustomPageView):
             **context,
             'regions': get_cached_regions()
         }
+
+
+def sitemap(request, file_name: str):
+    """Serve the sitemap file rendered by the `sitemaps` command."""
+    file_path = os.path.join(settings.SITEMAPS_DIR, file_name)
+    if not os.path.exists(os.path.join(settings.SITEMAPS_DIR, sitemaps.INDEX_FILE)):
+        sitemaps.generate()
+    if not os.path.exists(file_path):
+        raise Http404()
+    return FileResponse(open(file_path, 'rb'), content_type='application/xml')
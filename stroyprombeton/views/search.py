@@ -1,58 +1,34 @@
+from urllib.parse import urlencode
+
 from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.urls import reverse
+from django.views.generic import View
 
 from ecommerce.forms import OrderBackcallForm
-from pages.models import CustomPage, FlatPage, Page
+from pages.models import Page
 from search import views as search_views, search as search_engine
 
-from stroyprombeton import models as stb_models
+from stroyprombeton import autocomplete, models as stb_models, searching
 
 
 class Search(search_views.SearchView):
+    """Search page. See `stroyprombeton.searching` for the search query."""
 
-    # ignore CPDBear
-    search_entities = [
-        search_engine.Search(
-            name='category',
-            qs=stb_models.Category.objects.active(),
-            # ignore CPDBear
-            fields=['name'],
-            min_similarity=settings.TRIGRAM_MIN_SIMILARITY,
-        ),
-        search_engine.Search(
-            name='series',
-            qs=stb_models.Series.objects.active(),
-            # ignore CPDBear
-            fields=['name'],
-            min_similarity=settings.TRIGRAM_MIN_SIMILARITY,
-        ),
-        search_engine.Search(
-            name='product',
-            qs=stb_models.Product.objects.active(),
-            fields=['name', 'id'],
-            min_similarity=settings.TRIGRAM_MIN_SIMILARITY,
-        ),
-        search_engine.Search(
-            name='product',
-            qs=stb_models.Option.objects.active(),
-            # @todo #483:60m  Implement search by option.
-            #  Return back searching by `option.specification` field.
-            #  And test it of course.
-            fields=['mark'],
-            min_similarity=settings.TRIGRAM_MIN_SIMILARITY,
-        ),
-        search_engine.Search(
-            name='page',
-            qs=CustomPage.objects.active(),
-            fields=['name'],
-            min_similarity=settings.TRIGRAM_MIN_SIMILARITY,
-        ),
-        search_engine.Search(
-            name='page',
-            qs=FlatPage.objects.active(),
-            fields=['name'],
-            min_similarity=settings.TRIGRAM_MIN_SIMILARITY,
-        ),
-    ]
+    # entities are searched by `stroyprombeton.searching` module
+    search_entities = []
+    limit = 50
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        items = searching.search(request.GET.get('term', ''), self.limit)
+        context = self.get_context_data(object=self.object)
+        return render(
+            request,
+            'search/results.html' if items else 'search/no_results.html',
+            {**context, 'items': items},
+        )
 
     def get_context_data(self, **kwargs):
         context = super(Search, self).get_context_data(**kwargs)
@@ -63,7 +39,31 @@ class Search(search_views.SearchView):
         }
 
 
-class Autocomplete(search_views.AutocompleteView):
+class Autocomplete(View):
+    """Autocomplete by the in-memory index. See `stroyprombeton.autocomplete` for details."""
+
+    limit = 20
+    see_all_label = settings.SEARCH_SEE_ALL_LABEL
+
+    def get(self, request):
+        term = request.GET.get('term', '')
+        results = [
+            entry.as_dict()
+            for entry in autocomplete.index.get().search(term, self.limit)
+        ]
+        if results:
+            search_url = reverse('custom_page', args=('search',))
+            results.append({
+                'type': 'see_all',
+                'name': self.see_all_label,
+                'url': f'{search_url}?{urlencode({"term": term})}',
+            })
+        return JsonResponse(results, safe=False)
+
+
+# Autocomplete used it before the in-memory index.
+# Now the `benchmark_autocomplete` command compares them.
+class TrigramAutocomplete(search_views.AutocompleteView):
 
     # ignore CPDBear
     search_entities = [